@@ -0,0 +1,114 @@
+import copy
+import time
+from collections import Counter, OrderedDict
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from recipes.models import User
+
+TOKEN_KEY = 'auth_token:{0}:{1}'
+VERSION_KEY = 'auth_token_version:{0}'
+DEFERRED_USER_FIELDS = tuple(
+    f'user__{field}' for field in ('password', *User.counter_fields))
+
+
+class TokenCache:
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = Lock()
+        self.stats = Counter()
+
+    @property
+    def versions(self):
+        return caches[settings.TOKEN_CACHE]
+
+    @property
+    def shared(self):
+        if settings.TOKEN_CACHE_SHARED:
+            return caches[settings.TOKEN_CACHE]
+        return None
+
+    @staticmethod
+    def copy_token(token):
+        token = copy.copy(token)
+        token.user = copy.copy(token.user)
+        return token
+
+    def get_version(self, key):
+        version_key = VERSION_KEY.format(key)
+        if (version := self.versions.get(version_key)) is None:
+            version = time.time_ns()
+            if not self.versions.add(
+                    version_key, version, settings.TOKEN_CACHE_TIMEOUT):
+                version = self.versions.get(version_key, version)
+        return version
+
+    def get(self, key, version):
+        with self.lock:
+            if (entry := self.entries.get(key)) is not None:
+                expires, entry_version, token = entry
+                if expires > time.monotonic() and entry_version == version:
+                    self.entries.move_to_end(key)
+                    self.stats['local_hits'] += 1
+                    return self.copy_token(token)
+                del self.entries[key]
+        if (shared := self.shared) is not None and (
+                token := shared.get(TOKEN_KEY.format(key, version))
+        ) is not None:
+            self.stats['shared_hits'] += 1
+            self.set_local(key, version, token)
+            return self.copy_token(token)
+        self.stats['misses'] += 1
+        return None
+
+    def set_local(self, key, version, token):
+        with self.lock:
+            self.entries[key] = (
+                time.monotonic() + settings.TOKEN_CACHE_LOCAL_TIMEOUT,
+                version, token)
+            self.entries.move_to_end(key)
+            while len(self.entries) > settings.TOKEN_CACHE_LOCAL_SIZE:
+                self.entries.popitem(last=False)
+
+    def set(self, key, version, token):
+        token = self.copy_token(token)
+        if (shared := self.shared) is not None:
+            shared.set(
+                TOKEN_KEY.format(key, version), token,
+                settings.TOKEN_CACHE_TIMEOUT)
+        self.set_local(key, version, token)
+
+    def invalidate(self, *keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+        self.versions.set_many(
+            {VERSION_KEY.format(key): time.time_ns() for key in keys},
+            settings.TOKEN_CACHE_TIMEOUT)
+
+
+token_cache = TokenCache()
+
+
+class TokenAuthentication(TokenAuthentication):
+
+    def authenticate_credentials(self, key):
+        version = token_cache.get_version(key)
+        if (token := token_cache.get(key, version)) is not None:
+            return token.user, token
+        try:
+            token = self.get_model().objects.select_related('user').defer(
+                *DEFERRED_USER_FIELDS).get(key=key)
+        except self.get_model().DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.'))
+        token_cache.set(key, version, token)
+        return token.user, token
@@ -0,0 +1,287 @@
+import json
+import time
+from collections import Counter, OrderedDict
+from functools import partial
+from hashlib import md5
+from threading import Lock
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+VERSION_KEY = 'reference:{0}:version'
+ENTRY_KEY = 'reference:{0}:{1}:{2}'
+RESPONSE_KEY = 'response:{0}'
+RESPONSE_LOCK_KEY = 'response:{0}:lock'
+RESPONSE_TAG_KEY = 'response:tag:{0}'
+RESPONSE_LOCK_POLL = 0.05
+
+
+def get_etag(data):
+    return '"{}"'.format(md5(json.dumps(
+        data, ensure_ascii=False, sort_keys=True,
+        default=str).encode()).hexdigest())
+
+
+class ReferenceCache:
+
+    def __init__(self, namespace):
+        self.namespace = namespace
+        self.entries = OrderedDict()
+        self.version = None
+        self.lock = Lock()
+        self.stats = Counter()
+
+    @property
+    def shared(self):
+        return caches[settings.REFERENCE_CACHE]
+
+    def get_version(self):
+        version_key = VERSION_KEY.format(self.namespace)
+        if (version := self.shared.get(version_key)) is None:
+            version = time.time_ns()
+            if not self.shared.add(
+                    version_key, version, settings.CACHE_VERSION_TIMEOUT):
+                version = self.shared.get(version_key, version)
+        return version
+
+    def invalidate(self):
+        self.shared.set(
+            VERSION_KEY.format(self.namespace), time.time_ns(),
+            settings.CACHE_VERSION_TIMEOUT)
+
+    def get(self, key):
+        version = self.get_version()
+        with self.lock:
+            if self.version != version:
+                self.entries.clear()
+                self.version = version
+            if (entry := self.entries.get(key)) is not None:
+                self.entries.move_to_end(key)
+                self.stats['local_hits'] += 1
+                return entry, 'HIT-LOCAL'
+        entry = self.shared.get(ENTRY_KEY.format(self.namespace, version, key))
+        if entry is None:
+            self.stats['misses'] += 1
+            return None, 'MISS'
+        self.stats['shared_hits'] += 1
+        self.set_local(version, key, entry)
+        return entry, 'HIT-SHARED'
+
+    def set_local(self, version, key, entry):
+        with self.lock:
+            if self.version != version:
+                return
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > settings.REFERENCE_CACHE_LOCAL_SIZE:
+                self.entries.popitem(last=False)
+
+    def set(self, key, data):
+        version = self.get_version()
+        entry = {
+            'data': data,
+            'etag': get_etag(data),
+            'last_modified': version // 10 ** 9,
+        }
+        self.shared.set(
+            ENTRY_KEY.format(self.namespace, version, key), entry,
+            settings.REFERENCE_CACHE_TIMEOUT)
+        self.set_local(version, key, entry)
+        return entry
+
+
+reference_caches = {
+    namespace: ReferenceCache(namespace)
+    for namespace in ('tags', 'ingredients')
+}
+
+
+class ResponseCache:
+
+    def __init__(self):
+        self.stats = Counter()
+
+    @property
+    def shared(self):
+        return caches[settings.RESPONSE_CACHE]
+
+    def get_versions(self, tags):
+        keys = {tag: RESPONSE_TAG_KEY.format(tag) for tag in tags}
+        found = self.shared.get_many(keys.values())
+        return {tag: found.get(key) for tag, key in keys.items()}
+
+    def create_version(self, tag):
+        key, version = RESPONSE_TAG_KEY.format(tag), time.time_ns()
+        if not self.shared.add(key, version, settings.CACHE_VERSION_TIMEOUT):
+            version = self.shared.get(key, version)
+        return version
+
+    def invalidate(self, *tags):
+        version = time.time_ns()
+        self.shared.set_many(
+            {RESPONSE_TAG_KEY.format(tag): version for tag in tags},
+            settings.CACHE_VERSION_TIMEOUT)
+
+    def get(self, key):
+        entry = self.shared.get(RESPONSE_KEY.format(key))
+        if entry is None or (
+                self.get_versions(entry['versions']) != entry['versions']):
+            return None
+        return entry
+
+    def set(self, key, data, tags, started):
+        versions = self.get_versions(tags)
+        if any(version and version > started
+               for version in versions.values()):
+            return None
+        for tag, version in versions.items():
+            if version is None:
+                versions[tag] = self.create_version(tag)
+        entry = {'data': data, 'etag': get_etag(data), 'versions': versions}
+        self.shared.set(
+            RESPONSE_KEY.format(key), entry, settings.RESPONSE_CACHE_TIMEOUT)
+        return entry
+
+    def wait(self, key):
+        deadline = time.monotonic() + settings.RESPONSE_CACHE_LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(RESPONSE_LOCK_POLL)
+            if (entry := self.get(key)) is not None:
+                return entry
+            if self.shared.get(RESPONSE_LOCK_KEY.format(key)) is None:
+                return None
+        return None
+
+    def get_or_build(self, key, build, get_tags):
+        if (entry := self.get(key)) is not None:
+            self.stats['hits'] += 1
+            return entry, 'HIT'
+        lock_key = RESPONSE_LOCK_KEY.format(key)
+        locked = self.shared.add(
+            lock_key, 1, settings.RESPONSE_CACHE_LOCK_TIMEOUT)
+        if not locked and (entry := self.wait(key)) is not None:
+            self.stats['waits'] += 1
+            return entry, 'HIT-WAIT'
+        self.stats['misses'] += 1
+        try:
+            started = time.time_ns()
+            response = build()
+            if response.status_code != 200:
+                return response, 'MISS'
+            return self.set(
+                key, response.data, get_tags(response.data), started
+            ) or response, 'MISS'
+        finally:
+            if locked:
+                self.shared.delete(lock_key)
+
+
+response_cache = ResponseCache()
+
+
+class ReferenceCacheMixin:
+    cache_namespace = None
+
+    def get_cache_key(self, request, **kwargs):
+        return '{0}:{1}:{2}'.format(
+            self.action,
+            ':'.join(f'{name}={value}' for name, value in kwargs.items()),
+            '&'.join(sorted(
+                f'{name}={value}'
+                for name, values in request.query_params.lists()
+                for value in values)))
+
+    def get_cached_response(self, view, request, *args, **kwargs):
+        cache = reference_caches[self.cache_namespace]
+        key = md5(self.get_cache_key(request, **kwargs).encode()).hexdigest()
+        entry, status = cache.get(key)
+        if entry is None:
+            response = view(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            entry = cache.set(key, response.data)
+        if (response := get_conditional_response(
+                request, etag=entry['etag'],
+                last_modified=entry['last_modified'])) is None:
+            response = Response(entry['data'])
+        response['ETag'] = entry['etag']
+        response['Last-Modified'] = http_date(entry['last_modified'])
+        response['X-Cache'] = status
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().retrieve, request, *args, **kwargs)
+
+
+class AnonymousResponseCacheMixin:
+    response_cache_actions = ('list', 'retrieve')
+
+    def get_response_cache_key(self, request, **kwargs):
+        paginator = self.paginator
+        names = {
+            *self.filterset_class.base_filters,
+            *(getattr(paginator, name, None) for name in (
+                'page_query_param', 'page_size_query_param',
+                'cursor_query_param'))}
+        return md5('{0}:{1}:{2}'.format(
+            self.action,
+            ':'.join(f'{name}={value}' for name, value in kwargs.items()),
+            urlencode(sorted({
+                (name, value)
+                for name, values in request.query_params.lists()
+                if name in names
+                for value in values}))
+        ).encode()).hexdigest()
+
+    @staticmethod
+    def get_recipe_tags(recipe):
+        return {
+            f'recipe:{recipe["id"]}',
+            f'user:{recipe["author"]["id"]}',
+            *(f'tag:{tag["id"]}' for tag in recipe['tags'])}
+
+    def get_response_tags(self, data):
+        if self.action == 'retrieve':
+            return {'catalog', *self.get_recipe_tags(data)}
+        return {'catalog', 'recipes', *(
+            tag for recipe in data['results']
+            for tag in self.get_recipe_tags(recipe))}
+
+    def is_response_cacheable(self, request):
+        return (
+            self.action in self.response_cache_actions
+            and not request.user.is_authenticated
+            and request.accepted_renderer.format == 'json')
+
+    def get_cached_response(self, view, request, *args, **kwargs):
+        if not self.is_response_cacheable(request):
+            return view(request, *args, **kwargs)
+        response, status = response_cache.get_or_build(
+            self.get_response_cache_key(request, **kwargs),
+            partial(view, request, *args, **kwargs), self.get_response_tags)
+        if not isinstance(response, Response):
+            entry = response
+            if (response := get_conditional_response(
+                    request, etag=entry['etag'])) is None:
+                response = Response(entry['data'])
+            response['ETag'] = entry['etag']
+        patch_vary_headers(response, ('Authorization',))
+        response['X-Cache'] = status
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().retrieve, request, *args, **kwargs)
@@ -0,0 +1,38 @@
+from drf_extra_fields.fields import Base64ImageField
+from rest_framework import serializers
+
+from recipes.images import store_image
+
+
+class Base64ImageField(Base64ImageField):
+
+    def to_internal_value(self, data):
+        if data in self.EMPTY_VALUES:
+            return None
+        if not isinstance(data, str):
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+        return store_image(data)
+
+
+class ImageVariantsField(serializers.Field):
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def get_url(self, storage, name):
+        url = storage.url(name)
+        if (request := self.context.get('request')) is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+    def to_representation(self, recipe):
+        variants = recipe.image_variants
+        if not recipe.image or variants.get('source') != recipe.image.name:
+            return {}
+        return {
+            size: {
+                key: self.get_url(recipe.image.storage, name)
+                for key, name in formats.items()}
+            for size, formats in variants['sizes'].items()}
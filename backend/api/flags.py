@@ -0,0 +1,64 @@
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import caches
+
+from recipes.models import Favorite, Follow, ShoppingList
+
+FLAGS_KEY = 'user_flags:{0}:{1}'
+FLAG_SOURCES = {
+    'favorites': (Favorite, 'repice'),
+    'shopping_cart': (ShoppingList, 'repice'),
+    'subscriptions': (Follow, 'following'),
+}
+FLAG_MODELS = {model: name for name, (model, _) in FLAG_SOURCES.items()}
+
+
+class UserFlags:
+
+    def __init__(self, flags):
+        self.flags = flags
+
+    @staticmethod
+    def get_cache():
+        return caches[settings.USER_FLAGS_CACHE]
+
+    @staticmethod
+    def fetch(user_id, name):
+        model, field = FLAG_SOURCES[name]
+        return array('q', sorted(model.objects.filter(
+            user=user_id).values_list(field, flat=True)))
+
+    @staticmethod
+    def load(user_id):
+        keys = {name: FLAGS_KEY.format(user_id, name) for name in FLAG_SOURCES}
+        cache = UserFlags.get_cache()
+        cached = cache.get_many(keys.values())
+        flags, missing = {}, {}
+        for name, key in keys.items():
+            if (ids := cached.get(key)) is None:
+                ids = missing[key] = UserFlags.fetch(user_id, name)
+            flags[name] = ids
+        if missing:
+            cache.set_many(missing, settings.USER_FLAGS_CACHE_TIMEOUT)
+        return UserFlags(flags)
+
+    @staticmethod
+    def refresh(user_id, name):
+        UserFlags.get_cache().set(
+            FLAGS_KEY.format(user_id, name), UserFlags.fetch(user_id, name),
+            settings.USER_FLAGS_CACHE_TIMEOUT)
+
+    def contains(self, name, value):
+        ids = self.flags.get(name, ())
+        index = bisect_left(ids, value)
+        return index < len(ids) and ids[index] == value
+
+
+def get_user_flags(request):
+    if (flags := getattr(request, 'user_flags', None)) is None:
+        flags = request.user_flags = (
+            UserFlags.load(request.user.id) if request.user.is_authenticated
+            else UserFlags({}))
+    return flags
@@ -0,0 +1,282 @@
+import asyncio
+import logging
+import random
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+METRIC_PREFIX = 'foodgram_'
+COUNTERS = (
+    ('requests', 'http_requests_total', 'Число обработанных запросов'),
+    ('queries', 'db_queries_total', 'Число запросов к базе данных'),
+    ('duplicates', 'db_duplicate_queries_total',
+     'Повторы запросов с теми же параметрами'),
+    ('similar', 'db_similar_queries_total',
+     'Повторы запросов с тем же текстом SQL'),
+    ('db', 'db_duration_seconds_total', 'Время запросов к базе данных'),
+    ('view', 'view_duration_seconds_total',
+     'Время обработчика без учета базы данных'),
+    ('serialize', 'serialize_duration_seconds_total',
+     'Время сериализаторов без учета базы данных'),
+    ('render', 'render_duration_seconds_total',
+     'Время рендеринга ответа'),
+)
+LATENCY_METRIC = 'http_request_duration_seconds'
+LATENCY_HELP = 'Полное время обработки запроса'
+ROWS_METRIC = 'recipe_update_rows_total'
+ROWS_HELP = 'Строки тегов и состава, затронутые обновлением рецептов'
+CACHE_EVENTS_METRIC = 'cache_events_total'
+CACHE_EVENTS_HELP = 'Попадания и промахи кэшей'
+CACHE_HIT_RATIO_METRIC = 'cache_hit_ratio'
+CACHE_HIT_RATIO_HELP = 'Доля попаданий в кэш'
+CACHE_MISS_EVENT = 'misses'
+UNRESOLVED_VIEW = 'unresolved'
+DURATIONS = ('db', 'view', 'serialize', 'render', 'total')
+SERVER_TIMING = (
+    'db;dur={db:.2f};desc="queries={queries} duplicates={duplicates} '
+    'similar={similar}", view;dur={view:.2f}, '
+    'serialize;dur={serialize:.2f}, render;dur={render:.2f}, '
+    'total;dur={total:.2f}')
+SLOW_REQUEST_MESSAGE = (
+    'Медленный запрос {0} {1}: {total:.1f} мс, запросов к БД {queries} '
+    '(повторов {similar}), БД {db:.1f} мс, сериализация {serialize:.1f} мс, '
+    'рендеринг {render:.1f} мс. '
+    'Повторяющиеся запросы: {2}')
+SLOW_REQUEST_QUERIES = 3
+SLOW_REQUEST_SQL_LENGTH = 200
+
+logger = logging.getLogger(__name__)
+current_sample = ContextVar('current_sample', default=None)
+
+
+class RequestSample:
+
+    def __init__(self, request):
+        self.method = request.method
+        self.queries = Counter()
+        self.db_time = 0
+        self.started = time.perf_counter()
+        self.serialize_time = 0
+        self.serialize_depth = 0
+        self.view_finished = None
+        self.view_db_time = 0
+        self.lock = Lock()
+
+    def execute(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            with self.lock:
+                self.db_time += time.perf_counter() - started
+                self.queries[sql, repr(params)] += 1
+
+    @contextmanager
+    def serializing(self):
+        self.serialize_depth += 1
+        started, db_time = time.perf_counter(), self.db_time
+        try:
+            yield
+        finally:
+            self.serialize_depth -= 1
+            if not self.serialize_depth:
+                self.view_finished = time.perf_counter()
+                self.view_db_time = self.db_time
+                self.serialize_time += max(
+                    self.view_finished - started - (self.db_time - db_time),
+                    0)
+
+    def get_sql_counts(self):
+        counts = Counter()
+        for (sql, _), count in self.queries.items():
+            counts[sql] += count
+        return counts
+
+    def get_values(self):
+        finished = time.perf_counter()
+        queries = sum(self.queries.values())
+        view_finished, view_db_time = self.view_finished, self.view_db_time
+        if view_finished is None:
+            view_finished, view_db_time = finished, self.db_time
+        return {
+            'queries': queries,
+            'duplicates': queries - len(self.queries),
+            'similar': queries - len(self.get_sql_counts()),
+            'db': self.db_time,
+            'view': max(
+                view_finished - self.started - view_db_time
+                - self.serialize_time, 0),
+            'serialize': self.serialize_time,
+            'render': finished - view_finished,
+            'total': finished - self.started,
+        }
+
+
+class RequestMetrics:
+
+    def __init__(self):
+        self.lock = Lock()
+        self.totals = defaultdict(Counter)
+        self.buckets = defaultdict(lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+        self.rows_touched = Counter()
+
+    def add(self, labels, values):
+        with self.lock:
+            totals = self.totals[labels]
+            totals['requests'] += 1
+            for name in ('queries', 'duplicates', 'similar', *DURATIONS):
+                totals[name] += values[name]
+            self.buckets[labels][
+                bisect_left(LATENCY_BUCKETS, values['total'])] += 1
+
+    def add_rows_touched(self, rows):
+        with self.lock:
+            self.rows_touched.update(rows)
+
+    @staticmethod
+    def format_labels(labels, **extra):
+        view_name, method = labels
+        return '{{{0}}}'.format(','.join(
+            '{0}="{1}"'.format(name, str(value).replace(
+                '\\', r'\\').replace('"', r'\"'))
+            for name, value in (
+                ('view', view_name), ('method', method), *extra.items())))
+
+    def export(self):
+        with self.lock:
+            totals = {
+                labels: Counter(values)
+                for labels, values in self.totals.items()}
+            buckets = {
+                labels: list(values)
+                for labels, values in self.buckets.items()}
+            rows_touched = Counter(self.rows_touched)
+        for key, name, description in COUNTERS:
+            yield f'# HELP {METRIC_PREFIX}{name} {description}'
+            yield f'# TYPE {METRIC_PREFIX}{name} counter'
+            for labels, values in sorted(totals.items()):
+                yield '{0}{1}{2} {3}'.format(
+                    METRIC_PREFIX, name, self.format_labels(labels),
+                    values[key])
+        yield f'# HELP {METRIC_PREFIX}{LATENCY_METRIC} {LATENCY_HELP}'
+        yield f'# TYPE {METRIC_PREFIX}{LATENCY_METRIC} histogram'
+        for labels, counts in sorted(buckets.items()):
+            observed = 0
+            for bound, count in zip((*LATENCY_BUCKETS, '+Inf'), counts):
+                observed += count
+                yield '{0}{1}_bucket{2} {3}'.format(
+                    METRIC_PREFIX, LATENCY_METRIC,
+                    self.format_labels(labels, le=bound), observed)
+            yield '{0}{1}_sum{2} {3}'.format(
+                METRIC_PREFIX, LATENCY_METRIC, self.format_labels(labels),
+                totals[labels]['total'])
+            yield '{0}{1}_count{2} {3}'.format(
+                METRIC_PREFIX, LATENCY_METRIC, self.format_labels(labels),
+                observed)
+        yield f'# HELP {METRIC_PREFIX}{ROWS_METRIC} {ROWS_HELP}'
+        yield f'# TYPE {METRIC_PREFIX}{ROWS_METRIC} counter'
+        for kind, count in sorted(rows_touched.items()):
+            yield '{0}{1}{{kind="{2}"}} {3}'.format(
+                METRIC_PREFIX, ROWS_METRIC, kind, count)
+
+
+request_metrics = RequestMetrics()
+
+
+def export_cache_stats(stats):
+    stats = {name: Counter(events) for name, events in stats.items()}
+    yield f'# HELP {METRIC_PREFIX}{CACHE_EVENTS_METRIC} {CACHE_EVENTS_HELP}'
+    yield f'# TYPE {METRIC_PREFIX}{CACHE_EVENTS_METRIC} counter'
+    for name, events in sorted(stats.items()):
+        for event, count in sorted(events.items()):
+            yield '{0}{1}{{cache="{2}",event="{3}"}} {4}'.format(
+                METRIC_PREFIX, CACHE_EVENTS_METRIC, name, event, count)
+    yield (f'# HELP {METRIC_PREFIX}{CACHE_HIT_RATIO_METRIC} '
+           f'{CACHE_HIT_RATIO_HELP}')
+    yield f'# TYPE {METRIC_PREFIX}{CACHE_HIT_RATIO_METRIC} gauge'
+    for name, events in sorted(stats.items()):
+        total = sum(events.values())
+        yield '{0}{1}{{cache="{2}"}} {3}'.format(
+            METRIC_PREFIX, CACHE_HIT_RATIO_METRIC, name,
+            (total - events[CACHE_MISS_EVENT]) / total if total else 0)
+
+
+def record_query(execute, sql, params, many, context):
+    if (sample := current_sample.get()) is None:
+        return execute(sql, params, many, context)
+    return sample.execute(execute, sql, params, many, context)
+
+
+class SerializeTimingMixin:
+
+    def to_representation(self, instance):
+        if (sample := current_sample.get()) is None:
+            return super().to_representation(instance)
+        with sample.serializing():
+            return super().to_representation(instance)
+
+
+class InstrumentationMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if (sample := self.start(request)) is None:
+            return self.get_response(request)
+        token = current_sample.set(sample)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_sample.reset(token)
+        return self.finish(request, response, sample)
+
+    async def __acall__(self, request):
+        if (sample := self.start(request)) is None:
+            return await self.get_response(request)
+        token = current_sample.set(sample)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_sample.reset(token)
+        return self.finish(request, response, sample)
+
+    @staticmethod
+    def start(request):
+        if random.random() >= settings.INSTRUMENTATION_SAMPLE_RATE:
+            return None
+        request.instrumentation = sample = RequestSample(request)
+        return sample
+
+    @staticmethod
+    def finish(request, response, sample):
+        values = sample.get_values()
+        view_name = (
+            match.view_name if (match := request.resolver_match) is not None
+            else UNRESOLVED_VIEW)
+        request_metrics.add((view_name, sample.method), values)
+        milliseconds = {
+            name: value * 1000 if name in DURATIONS else value
+            for name, value in values.items()}
+        if settings.INSTRUMENTATION_SERVER_TIMING:
+            response['Server-Timing'] = SERVER_TIMING.format(**milliseconds)
+        if milliseconds['total'] >= settings.INSTRUMENTATION_SLOW_REQUEST_MS:
+            logger.warning(SLOW_REQUEST_MESSAGE.format(
+                sample.method, request.get_full_path(), '; '.join(
+                    f'{count}x {sql[:SLOW_REQUEST_SQL_LENGTH]}'
+                    for sql, count in sample.get_sql_counts().most_common(
+                        SLOW_REQUEST_QUERIES) if count > 1) or '-',
+                **milliseconds))
+        return response
@@ -0,0 +1,184 @@
+import gc
+import json
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from statistics import mean, quantiles
+from time import perf_counter
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, reset_queries
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import (Favorite, Follow, Ingredient, Recipe,
+                            ShoppingList, Tag, User)
+
+SCENARIOS = (
+    ('recipes_anonymous', 'GET', '/api/recipes/?limit=10', False),
+    ('recipes', 'GET', '/api/recipes/?limit=10', True),
+    ('recipes_page', 'GET', '/api/recipes/?limit=10&page=20', True),
+    ('recipes_cursor', 'GET', '/api/recipes/?limit=10&cursor=', True),
+    ('recipes_filtered', 'GET',
+     '/api/recipes/?limit=10&is_favorited=1&tags={tag}', True),
+    ('recipes_author', 'GET', '/api/recipes/?limit=10&author={author}', True),
+    ('recipes_search', 'GET', '/api/recipes/?limit=10&search={word}', True),
+    ('recipe_detail', 'GET', '/api/recipes/{recipe}/', True),
+    ('feed', 'GET', '/api/recipes/feed/?limit=10', True),
+    ('subscriptions', 'GET',
+     '/api/users/subscriptions/?limit=6&recipes_limit=3', True),
+    ('users', 'GET', '/api/users/?limit=10', True),
+    ('user_detail', 'GET', '/api/users/{author}/', True),
+    ('tags', 'GET', '/api/tags/', False),
+    ('ingredients', 'GET', '/api/ingredients/?name={prefix}', False),
+    ('shopping_cart', 'GET', '/api/recipes/download_shopping_cart/', True),
+    ('favorite_toggle', 'POST', '/api/recipes/{new_recipe}/favorite/', True),
+)
+NO_DATA = ('Нет данных: нужны пользователь с подписками, рецепты и теги, '
+           'сгенерируйте их командой generate_data')
+UNKNOWN_SCENARIO = 'Неизвестные сценарии: {0}'
+REPORT = ('{0:<20} p50 {p50:>8.2f} мс  p99 {p99:>8.2f} мс  '
+          'запросов к БД {queries:>3}  память {memory:>8.1f} КиБ  '
+          'ошибок {errors}')
+CHANGE = '{0:<20} p50 {1:>+7.1f}%  p99 {2:>+7.1f}%  запросов к БД {3:>+3}'
+REGRESSIONS = 'Регрессии: {0}'
+
+
+class Command(BaseCommand):
+    help = ('Замер основных эндпоинтов API: p50/p99, запросы к базе '
+            'данных и память на запрос, с сохранением и сравнением '
+            'результатов')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--user', help='Email пользователя для запросов')
+        parser.add_argument('--scenario', action='append', dest='scenarios',
+                            help='Запустить только указанные сценарии')
+        parser.add_argument('--output', type=Path,
+                            help='Файл для сохранения результатов (JSON)')
+        parser.add_argument('--compare', type=Path,
+                            help='Файл с результатами прошлого запуска')
+        parser.add_argument(
+            '--threshold', type=float, default=20,
+            help='Допустимый рост p50 в процентах при сравнении')
+
+    def get_context(self, user):
+        recipe = Recipe.objects.order_by('-favorites_count').first()
+        tag = Tag.objects.annotate(
+            recipes_count=Count('recipes')).order_by('-recipes_count').first()
+        ingredient = Ingredient.objects.order_by('id').first()
+        new_recipe = Recipe.objects.exclude(
+            favorites__user=user).order_by('id').first()
+        if None in (recipe, tag, ingredient, new_recipe):
+            raise CommandError(NO_DATA)
+        return {
+            'recipe': recipe.id,
+            'new_recipe': new_recipe.id,
+            'author': recipe.author_id,
+            'tag': tag.slug,
+            'word': recipe.name.split()[0],
+            'prefix': ingredient.name[:2],
+        }
+
+    def request(self, client, method, url):
+        response = getattr(client, method.lower())(url)
+        if method == 'POST' and response.status_code == 201:
+            client.delete(url)
+        return response
+
+    def measure(self, client, method, url, options):
+        gc.collect()
+        for _ in range(options['warmup']):
+            self.request(client, method, url)
+        timings, errors = [], 0
+        for _ in range(options['repeat']):
+            start = perf_counter()
+            response = self.request(client, method, url)
+            timings.append((perf_counter() - start) * 1000)
+            errors += response.status_code >= 400
+        reset_queries()
+        with CaptureQueriesContext(connection) as context:
+            self.request(client, method, url)
+        queries = len(context.captured_queries)
+        tracemalloc.start()
+        try:
+            self.request(client, method, url)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        percentiles = quantiles(timings, n=100) if len(timings) > 1 else (
+            timings * 99)
+        return {
+            'url': url,
+            'p50': percentiles[49],
+            'p99': percentiles[98],
+            'mean': mean(timings),
+            'queries': queries,
+            'memory': peak / 1024,
+            'errors': errors,
+        }
+
+    def compare(self, results, path, threshold):
+        baseline = json.loads(Path(path).read_text())['results']
+        regressions = []
+        for name, result in results.items():
+            if (previous := baseline.get(name)) is None:
+                continue
+            p50, p99 = (
+                (result[key] / previous[key] - 1) * 100
+                if previous[key] else 0 for key in ('p50', 'p99'))
+            queries = result['queries'] - previous['queries']
+            line = CHANGE.format(name, p50, p99, queries)
+            if queries > 0 or p50 > threshold:
+                regressions.append(name)
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+        return regressions
+
+    def handle(self, *args, **options):
+        scenarios = SCENARIOS
+        if options['scenarios']:
+            names = {name for name, *_ in SCENARIOS}
+            if (unknown := set(options['scenarios']) - names):
+                raise CommandError(UNKNOWN_SCENARIO.format(
+                    ', '.join(sorted(unknown))))
+            scenarios = [
+                scenario for scenario in SCENARIOS
+                if scenario[0] in options['scenarios']]
+        user = (
+            User.objects.filter(email=options['user']).first()
+            if options['user']
+            else User.objects.order_by('-subscriptions_count').first())
+        if user is None:
+            raise CommandError(NO_DATA)
+        context = self.get_context(user)
+        token, _ = Token.objects.get_or_create(user=user)
+        clients = {False: APIClient(), True: APIClient()}
+        clients[True].credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.stdout.write(self.style.WARNING('Замер эндпоинтов...'))
+        results = {}
+        for name, method, path, authenticated in scenarios:
+            results[name] = self.measure(
+                clients[authenticated], method, path.format(**context),
+                options)
+            self.stdout.write(REPORT.format(name, **results[name]))
+        if options['output']:
+            Path(options['output']).write_text(json.dumps({
+                'created': datetime.now().isoformat(timespec='seconds'),
+                'vendor': connection.vendor,
+                'user': user.email,
+                'repeat': options['repeat'],
+                'data': {
+                    model._meta.model_name: model.objects.count()
+                    for model in (User, Follow, Recipe, Favorite,
+                                  ShoppingList)},
+                'results': results,
+            }, ensure_ascii=False, indent=2))
+        if options['compare'] and (regressions := self.compare(
+                results, options['compare'], options['threshold'])):
+            raise CommandError(REGRESSIONS.format(', '.join(regressions)))
+        self.stdout.write(self.style.SUCCESS('Замер завершен'))
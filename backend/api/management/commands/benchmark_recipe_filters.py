@@ -0,0 +1,59 @@
+from time import perf_counter
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe, Tag, User
+
+FILTERS = (
+    '',
+    'tags={tag}',
+    'tags={tag}&tags={other_tag}',
+    'is_favorited=1',
+    'is_in_shopping_cart=1',
+    'is_favorited=1&tags={tag}',
+    'is_favorited=1&is_in_shopping_cart=1',
+    'is_favorited=1&is_in_shopping_cart=1&tags={tag}&tags={other_tag}',
+    'author={author}&tags={tag}',
+)
+NO_DATA = 'Нет данных: нужны пользователь, рецепты и два тега'
+REPORT = '{0:<70} {1:>8.2f} мс {2:>4} запросов {3:>4} рецептов'
+
+
+class Command(BaseCommand):
+    help = 'Замер комбинаций фильтров списка рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument('--user', help='Email пользователя для запросов')
+
+    def handle(self, *args, **options):
+        user = (
+            User.objects.get(email=options['user']) if options['user']
+            else User.objects.first())
+        tags = list(Tag.objects.annotate(
+            recipes_count=Count('recipes')).order_by(
+            '-recipes_count').values_list('slug', flat=True)[:2])
+        recipe = Recipe.objects.first()
+        if user is None or recipe is None or len(tags) < 2:
+            raise CommandError(NO_DATA)
+        client = APIClient()
+        client.force_authenticate(user)
+        for query in FILTERS:
+            url = '/api/recipes/?limit={0}&{1}'.format(
+                options['limit'], query.format(
+                    tag=tags[0], other_tag=tags[1],
+                    author=recipe.author_id))
+            start = perf_counter()
+            for _ in range(options['repeat']):
+                response = client.get(url)
+            elapsed = (perf_counter() - start) * 1000 / options['repeat']
+            with CaptureQueriesContext(connection) as context:
+                client.get(url)
+            self.stdout.write(REPORT.format(
+                query or '-', elapsed, len(context.captured_queries),
+                response.data['count']))
@@ -0,0 +1,60 @@
+from concurrent.futures import ThreadPoolExecutor
+from statistics import quantiles
+from time import perf_counter
+from urllib.parse import quote
+from urllib.request import Request, urlopen
+
+from django.core.management import BaseCommand
+
+PATHS = (
+    '/api/recipes/?limit=10',
+    '/api/recipes/?limit=10&is_favorited=1',
+    '/api/tags/',
+    '/api/ingredients/?name=са',
+)
+REPORT = ('{0:<45} {1:>8.1f} зап/с  p50 {2:>7.1f} мс  p99 {3:>7.1f} мс  '
+          'ошибок {4}')
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный тест эндпоинтов чтения запущенного сервера '
+            '(WSGI или ASGI) конкурентными клиентами')
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='Адрес сервера, например '
+                                        'http://127.0.0.1:9000')
+        parser.add_argument('--path', action='append', dest='paths')
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--token', help='Токен для авторизованных '
+                                            'запросов')
+
+    def fetch(self, url):
+        request = Request(url, headers=self.headers)
+        start = perf_counter()
+        try:
+            with urlopen(request, timeout=30) as response:
+                response.read()
+                failed = response.status != 200
+        except OSError:
+            failed = True
+        return (perf_counter() - start) * 1000, failed
+
+    def handle(self, *args, **options):
+        self.headers = {'Accept': 'application/json'}
+        if options['token']:
+            self.headers['Authorization'] = f'Token {options["token"]}'
+        self.stdout.write(self.style.WARNING('Нагрузочный тест...'))
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            for path in options['paths'] or PATHS:
+                url = options['url'].rstrip('/') + quote(path, safe='/?&=%')
+                start = perf_counter()
+                results = list(executor.map(
+                    self.fetch, [url] * options['requests']))
+                elapsed = perf_counter() - start
+                timings = [timing for timing, _ in results]
+                percentiles = quantiles(timings, n=100)
+                self.stdout.write(REPORT.format(
+                    path, len(results) / elapsed, percentiles[49],
+                    percentiles[98], sum(failed for _, failed in results)))
+        self.stdout.write(self.style.SUCCESS('Тест завершен'))
@@ -1,5 +1,103 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from recipes.models import FeedEntry
+
+INVALID_CURSOR = 'Некорректный курсор.'
 
 
 class LimitPagination(PageNumberPagination):
     page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    cursor_ordering = ('-pub_date', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        self.limit = self.get_page_size(request)
+        self.ordering = [
+            (name.lstrip('-'), name.startswith('-'))
+            for name in getattr(view, 'cursor_ordering', self.cursor_ordering)
+        ]
+        queryset = queryset.order_by(*(
+            f'-{name}' if descending else name
+            for name, descending in self.ordering))
+        if (cursor := request.query_params[self.cursor_query_param]):
+            queryset = queryset.filter(
+                self.get_keyset_filter(queryset.model, cursor))
+        page = list(queryset[:self.limit + 1])
+        self.has_next = len(page) > self.limit
+        self.page = page[:self.limit]
+        return self.page
+
+    def decode_cursor(self, model, cursor):
+        try:
+            values = json.loads(urlsafe_b64decode(cursor.encode()))
+            return [
+                model._meta.get_field(name).to_python(value)
+                for (name, _), value in zip(self.ordering, values, strict=True)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(INVALID_CURSOR)
+
+    def get_keyset_filter(self, model, cursor):
+        position = self.decode_cursor(model, cursor)
+        conditions = []
+        for index, (name, descending) in enumerate(self.ordering):
+            condition = Q(**{
+                f'{name}__lt' if descending else f'{name}__gt':
+                position[index]})
+            for (prev_name, _), value in zip(self.ordering, position[:index]):
+                condition &= Q(**{prev_name: value})
+            conditions.append(condition)
+        return reduce(or_, conditions)
+
+    def encode_cursor(self, instance):
+        return urlsafe_b64encode(json.dumps([
+            instance._meta.get_field(name).value_to_string(instance)
+            for name, _ in self.ordering
+        ]).encode()).decode()
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param,
+            self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response({'next': self.get_next_link(), 'results': data})
+
+
+class FeedPagination(LimitPagination):
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = True
+        self.request = request
+        self.limit = self.get_page_size(request)
+        self.ordering = [('pub_date', True), ('id', True)]
+        position = None
+        if (cursor := request.query_params.get(self.cursor_query_param)):
+            position = self.decode_cursor(queryset.model, cursor)
+        recipe_ids = FeedEntry.get_feed(request.user, position, self.limit + 1)
+        self.has_next = len(recipe_ids) > self.limit
+        recipes = queryset.in_bulk(recipe_ids[:self.limit])
+        self.page = [
+            recipes[recipe_id] for recipe_id in recipe_ids[:self.limit]
+            if recipe_id in recipes]
+        return self.page
@@ -0,0 +1,112 @@
+import csv
+from abc import ABC, abstractmethod
+from io import BytesIO
+from pathlib import Path
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+TEMPLATE_SHOP_LIST = '{0}: {1} {2} '
+CSV_HEADER = ('Продукт', 'Единица измерения', 'Количество')
+PDF_TITLE = 'Список покупок'
+PDF_FONT_NAME = 'ShoppingListFont'
+PDF_DEFAULT_FONT = 'Helvetica'
+PDF_FONT_SIZE = 12
+PDF_MARGIN = 50
+PDF_LINE_HEIGHT = 18
+
+
+class ShoppingListRenderer(ABC, BaseRenderer):
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            return JSONRenderer().render(data)
+        return b''.join(self.export(data))
+
+    @abstractmethod
+    def export(self, ingredients):
+        pass
+
+
+class TextShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def export(self, ingredients):
+        for ingredient in ingredients:
+            yield TEMPLATE_SHOP_LIST.format(
+                ingredient['ingredients__name'],
+                ingredient['ingredients__measurement_unit'],
+                ingredient['value']).encode(self.charset)
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+class CSVShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def export(self, ingredients):
+        writer = csv.writer(Echo())
+        yield writer.writerow(CSV_HEADER).encode(self.charset)
+        for ingredient in ingredients:
+            yield writer.writerow((
+                ingredient['ingredients__name'],
+                ingredient['ingredients__measurement_unit'],
+                ingredient['value'])).encode(self.charset)
+
+
+class PDFShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+
+    @staticmethod
+    def get_font():
+        if PDF_FONT_NAME in pdfmetrics.getRegisteredFontNames():
+            return PDF_FONT_NAME
+        if not Path(settings.SHOPPING_LIST_PDF_FONT).is_file():
+            return PDF_DEFAULT_FONT
+        pdfmetrics.registerFont(
+            TTFont(PDF_FONT_NAME, settings.SHOPPING_LIST_PDF_FONT))
+        return PDF_FONT_NAME
+
+    def export(self, ingredients):
+        buffer = BytesIO()
+        font = self.get_font()
+        page = canvas.Canvas(buffer, pagesize=A4, invariant=True)
+        _, height = A4
+        page.setFont(font, PDF_FONT_SIZE)
+        page.drawString(PDF_MARGIN, height - PDF_MARGIN, PDF_TITLE)
+        position = height - PDF_MARGIN - PDF_LINE_HEIGHT * 2
+        for ingredient in ingredients:
+            if position < PDF_MARGIN:
+                page.showPage()
+                page.setFont(font, PDF_FONT_SIZE)
+                position = height - PDF_MARGIN
+            page.drawString(PDF_MARGIN, position, (
+                f'{ingredient["ingredients__name"]} '
+                f'({ingredient["ingredients__measurement_unit"]}) — '
+                f'{ingredient["value"]}'))
+            position -= PDF_LINE_HEIGHT
+        page.save()
+        yield buffer.getvalue()
+
+
+class MetricsRenderer(BaseRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            return JSONRenderer().render(data)
+        return ''.join(f'{line}\n' for line in data).encode(self.charset)
@@ -1,10 +1,16 @@
+import logging
 from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
 from djoser.serializers import UserCreateSerializer, UserSerializer
-from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 
-from recipes.models import (Composition, Favorite, Follow, Ingredient,
-                            Recipe, ShoppingList, Tag, User)
+from api.fields import Base64ImageField, ImageVariantsField
+from api.flags import get_user_flags
+from api.instrumentation import SerializeTimingMixin, request_metrics
+from recipes.models import (Composition, Follow, Ingredient, Recipe,
+                            ShoppingListIngredient, Tag, User)
 
 ERROR_MESSAGE_IMAGE = 'Изображение обязательное поле'
 ERROR_MESSAGE_TAGS = 'Нельзя указать два одинаковых тега: {}'
@@ -12,9 +18,12 @@ RROR_MESSAGE_INGRESIENTS = 'Нельзя указать два одинаков
 DOES_NOT_EXISTS_INGREDIENT = 'Ингредиент не найден'
 NOT_FOUND_MESSAGE = 'Отсутствует: {}'
 LIST_EMPTY = 'Список {} не может быть пустым.'
+ROWS_TOUCHED_MESSAGE = 'Обновление рецепта {0}: {1}'
+
+logger = logging.getLogger(__name__)
 
 
-class UserSerializer(UserSerializer):
+class UserSerializer(SerializeTimingMixin, UserSerializer):
     is_subscribed = serializers.SerializerMethodField()
 
     class Meta(UserSerializer.Meta):
@@ -24,10 +33,8 @@ class UserSerializer(UserSerializer):
             'is_subscribed')
 
     def get_is_subscribed(self, author):
-        user = self.context['request'].user
-        if not user.is_authenticated:
-            return False
-        return Follow.objects.filter(user=user, following=author).exists()
+        return get_user_flags(self.context['request']).contains(
+            'subscriptions', author.id)
 
 
 class CreateUserSerializer(UserCreateSerializer):
@@ -37,7 +44,7 @@ class CreateUserSerializer(UserCreateSerializer):
             'email', 'id', 'username', 'first_name', 'last_name', 'password')
 
 
-class FollowSerializator(serializers.ModelSerializer):
+class FollowSerializator(SerializeTimingMixin, serializers.ModelSerializer):
     email = serializers.ReadOnlyField(source='following.email')
     id = serializers.ReadOnlyField(source='following.id')
     username = serializers.ReadOnlyField(source='following.username')
@@ -45,7 +52,8 @@ class FollowSerializator(serializers.ModelSerializer):
     last_name = serializers.ReadOnlyField(source='following.last_name')
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.ReadOnlyField(source='following.recipes.count')
+    recipes_count = serializers.ReadOnlyField(
+        source='following.recipes_count')
 
     class Meta:
         model = Follow
@@ -54,32 +62,36 @@ class FollowSerializator(serializers.ModelSerializer):
             'is_subscribed', 'recipes', 'recipes_count')
 
     def get_is_subscribed(self, source):
-        return Follow.objects.filter(
-            user=source.user, following=source.following).exists()
+        return True
 
     def get_recipes(self, source):
-        recipes_limit = self.context.get('request').GET.get('recipes_limit')
-        recipes = Recipe.objects.filter(author=source.following)
-        if recipes_limit:
-            recipes = recipes[:int(recipes_limit)]
+        if (recipes := getattr(source, 'recipes_preview', None)) is None:
+            recipes_limit = self.context.get('request').GET.get(
+                'recipes_limit')
+            recipes = Recipe.objects.filter(author=source.following)
+            if recipes_limit:
+                recipes = recipes[:int(recipes_limit)]
         return RecipeForFollowwerSerializer(recipes, many=True).data
 
 
-class RecipeForFollowwerSerializer(serializers.ModelSerializer):
+class RecipeForFollowwerSerializer(SerializeTimingMixin,
+                                   serializers.ModelSerializer):
     image = Base64ImageField()
+    images = ImageVariantsField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'images', 'cooking_time')
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(SerializeTimingMixin, serializers.ModelSerializer):
     class Meta:
         model = Tag
         fields = ('id', 'name', 'color', 'slug')
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(SerializeTimingMixin,
+                           serializers.ModelSerializer):
     class Meta:
         model = Ingredient
         fields = ('id', 'name', 'measurement_unit')
@@ -105,35 +117,34 @@ class CreateIngredientCountSerializer(serializers.ModelSerializer):
         fields = ('id', 'amount', )
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(SerializeTimingMixin, serializers.ModelSerializer):
     tags = TagSerializer(many=True, read_only=True)
     author = UserSerializer(read_only=True)
     ingredients = IngredientCountSerializer(
         many=True, read_only=True, source='compositions')
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    images = ImageVariantsField()
 
-    def check(self, model, recipe):
-        user = self.context.get('request').user
-
-        if not user.is_authenticated:
-            return False
-        return model.objects.filter(user=user, repice=recipe).exists()
+    def check(self, recipe, flag):
+        return get_user_flags(self.context.get('request')).contains(
+            flag, recipe.id)
 
     def get_is_favorited(self, recipe):
-        return self.check(model=Favorite, recipe=recipe)
+        return self.check(recipe=recipe, flag='favorites')
 
     def get_is_in_shopping_cart(self, recipe):
-        return self.check(model=ShoppingList, recipe=recipe)
+        return self.check(recipe=recipe, flag='shopping_cart')
 
     class Meta:
         model = Recipe
         fields = (
-            'id', 'tags', 'author', 'ingredients', 'name', 'image', 'text',
-            'cooking_time', 'is_favorited', 'is_in_shopping_cart')
+            'id', 'tags', 'author', 'ingredients', 'name', 'image', 'images',
+            'text', 'cooking_time', 'is_favorited', 'is_in_shopping_cart')
 
 
-class CreateRecipeSerializer(serializers.ModelSerializer):
+class CreateRecipeSerializer(SerializeTimingMixin,
+                             serializers.ModelSerializer):
     image = Base64ImageField(required=True)
     tags = serializers.PrimaryKeyRelatedField(
         queryset=Tag.objects.all(), many=True)
@@ -163,15 +174,17 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
         if ingredients == []:
             raise serializers.ValidationError(
                 LIST_EMPTY.format('ингредиентов'))
-        items = []
+        counts = Counter(ingredient['id'] for ingredient in ingredients)
+        found = Ingredient.objects.in_bulk(counts)
+        if len(found) != len(counts):
+            raise serializers.ValidationError(DOES_NOT_EXISTS_INGREDIENT)
+        if (repeat := ' '.join(
+                found[id].name for id, count in counts.items() if count > 1
+        )):
+            raise serializers.ValidationError(
+                RROR_MESSAGE_INGRESIENTS.format(repeat))
         for ingredient in ingredients:
-            if not Ingredient.objects.filter(id=ingredient['id']).exists():
-                raise serializers.ValidationError(DOES_NOT_EXISTS_INGREDIENT)
-            if ingredient['id'] in items:
-                raise serializers.ValidationError(
-                    RROR_MESSAGE_INGRESIENTS.format(
-                        Ingredient.objects.get(id=ingredient['id'])))
-            items.append(ingredient['id'])
+            ingredient['ingredients'] = found[ingredient['id']]
         return ingredients
 
     @staticmethod
@@ -179,7 +192,7 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
         Composition.objects.bulk_create(
             Composition(
                 recipe=recipe,
-                ingredients=Ingredient.objects.get(id=ingredient['id']),
+                ingredients=ingredient['ingredients'],
                 amount=ingredient['amount']) for ingredient in ingredients)
 
     @staticmethod
@@ -189,6 +202,7 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
                 NOT_FOUND_MESSAGE.format(not_exists))
         return *[data.pop(value) for value in pop_list], data
 
+    @transaction.atomic
     def create(self, validated_data):
         tags, ingredients, validated_data = self.pop_elements(
             validated_data, ['tags', 'ingredients'])
@@ -197,21 +211,75 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
         self.create_ingredient(recipe=recipe, ingredients=ingredients)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         tags, ingredients, validated_data = self.pop_elements(
             validated_data, ['tags', 'ingredients'])
-        instance.tags.set(tags)
-        Composition.objects.filter(recipe=instance).delete()
-        self.create_ingredient(recipe=instance, ingredients=ingredients)
-
+        self.rows_touched = {
+            **self.update_tags(instance, tags),
+            **self.update_ingredients(instance, ingredients)}
+        logger.info(ROWS_TOUCHED_MESSAGE.format(
+            instance.id, self.rows_touched))
+        request_metrics.add_rows_touched(self.rows_touched)
         return super().update(instance, validated_data)
 
+    @staticmethod
+    def update_tags(recipe, tags):
+        current = set(recipe.tags.values_list('id', flat=True))
+        new = {tag.id for tag in tags}
+        if (removed := current - new):
+            recipe.tags.remove(*removed)
+        if (added := new - current):
+            recipe.tags.add(*added)
+        return {'tags_added': len(added), 'tags_removed': len(removed)}
+
+    def update_ingredients(self, recipe, ingredients):
+        compositions = {
+            composition.ingredients_id: composition
+            for composition in recipe.compositions.all()}
+        old_amounts = {
+            ingredient_id: composition.amount
+            for ingredient_id, composition in compositions.items()}
+        new_amounts = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in ingredients}
+        changed = []
+        for ingredient_id, amount in new_amounts.items():
+            if (composition := compositions.get(ingredient_id)) is not None:
+                if composition.amount != amount:
+                    composition.amount = amount
+                    changed.append(composition)
+        Composition.objects.bulk_update(changed, ['amount'])
+        created = new_amounts.keys() - old_amounts.keys()
+        self.create_ingredient(recipe=recipe, ingredients=[
+            ingredient for ingredient in ingredients
+            if ingredient['id'] in created])
+        if (removed := old_amounts.keys() - new_amounts.keys()):
+            Composition.objects.filter(
+                recipe=recipe, ingredients_id__in=removed).delete()
+        ShoppingListIngredient.recipe_changed(
+            recipe, old_amounts, new_amounts)
+        return {
+            'compositions_updated': len(changed),
+            'compositions_created': len(created),
+            'compositions_deleted': len(removed)}
+
     def to_representation(self, instance):
+        request = self.context.get('request')
         return RecipeSerializer(
-            instance, context={'request': self.context.get('request')}).data
+            Recipe.objects.for_feed().get(pk=instance.pk),
+            context={'request': request}).data
 
 
-class FavoriteSerializer(serializers.ModelSerializer):
+class FavoriteSerializer(SerializeTimingMixin, serializers.ModelSerializer):
+    images = ImageVariantsField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'images', 'cooking_time')
+
+
+class BatchSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False,
+        max_length=settings.RELATIONS_BATCH_MAX_SIZE)
@@ -0,0 +1,115 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.authentication import token_cache
+from api.caches import reference_caches, response_cache
+from api.flags import FLAG_MODELS, UserFlags
+from api.instrumentation import record_query
+from recipes.images import variants_created
+from recipes.models import (Composition, Favorite, Follow, Ingredient, Recipe,
+                            ShoppingList, Tag, User)
+from recipes.signals import catalog_imported, relations_changed
+
+
+@receiver(connection_created)
+def add_query_recorder(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def invalidate_responses(*tags):
+    transaction.on_commit(partial(response_cache.invalidate, *tags))
+
+
+@receiver((post_save, post_delete, catalog_imported), sender=Tag)
+def invalidate_tags(**kwargs):
+    transaction.on_commit(reference_caches['tags'].invalidate)
+
+
+@receiver((post_save, post_delete, catalog_imported), sender=Ingredient)
+def invalidate_ingredients(**kwargs):
+    transaction.on_commit(reference_caches['ingredients'].invalidate)
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=ShoppingList)
+@receiver((post_save, post_delete), sender=Follow)
+def refresh_user_flags(sender, instance, **kwargs):
+    transaction.on_commit(partial(
+        UserFlags.refresh, instance.user_id, FLAG_MODELS[sender]))
+
+
+@receiver(relations_changed, sender=Favorite)
+@receiver(relations_changed, sender=ShoppingList)
+@receiver(relations_changed, sender=Follow)
+def refresh_changed_user_flags(sender, user_id, **kwargs):
+    transaction.on_commit(partial(
+        UserFlags.refresh, user_id, FLAG_MODELS[sender]))
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_recipe_responses(instance, **kwargs):
+    invalidate_responses('recipes', f'recipe:{instance.id}')
+
+
+@receiver((post_save, post_delete), sender=Composition)
+def invalidate_composition_responses(instance, **kwargs):
+    invalidate_responses(f'recipe:{instance.recipe_id}')
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags_responses(instance, action, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if isinstance(instance, Recipe):
+        invalidate_responses('recipes', f'recipe:{instance.id}')
+    else:
+        invalidate_responses('recipes', f'tag:{instance.id}', *(
+            f'recipe:{pk}' for pk in pk_set or ()))
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tag_responses(instance, **kwargs):
+    invalidate_responses('recipes', f'tag:{instance.id}')
+
+
+@receiver(catalog_imported, sender=Tag)
+@receiver((post_save, post_delete, catalog_imported), sender=Ingredient)
+def invalidate_catalog_responses(**kwargs):
+    invalidate_responses('catalog')
+
+
+def is_login_update(update_fields):
+    return update_fields is not None and set(update_fields) == {'last_login'}
+
+
+@receiver((post_save, post_delete), sender=User)
+def invalidate_user_responses(instance, update_fields=None, **kwargs):
+    if not is_login_update(update_fields):
+        invalidate_responses(f'user:{instance.id}')
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(instance, update_fields=None, **kwargs):
+    if not is_login_update(update_fields):
+        transaction.on_commit(partial(
+            token_cache.invalidate, *Token.objects.filter(
+                user=instance.id).values_list('key', flat=True)))
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(instance, **kwargs):
+    transaction.on_commit(partial(token_cache.invalidate, instance.key))
+
+
+@receiver(variants_created, sender=Recipe)
+def invalidate_image_responses(image, **kwargs):
+    invalidate_responses(*(
+        f'recipe:{pk}'
+        for pk in Recipe.objects.filter(image=image).values_list(
+            'id', flat=True)))
@@ -0,0 +1,496 @@
+import json
+import re
+import shutil
+import tempfile
+from base64 import urlsafe_b64encode
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import skipUnless
+
+from django.core.cache import caches
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.authentication import TokenCache, token_cache
+from api.caches import reference_caches
+from recipes.models import (Composition, Favorite, FeedEntry, Follow,
+                            Ingredient, Recipe, ShoppingList,
+                            ShoppingListIngredient, Tag, User)
+
+RECIPE_LIST_QUERIES = 4
+RECIPE_DETAIL_QUERIES = 3
+RECIPE_CREATE_QUERIES = 22
+RECIPE_UPDATE_QUERIES = 23
+SUBSCRIPTIONS_QUERIES = 3
+EXPLAIN_ENDPOINTS = {
+    '/api/recipes/?limit=10': (
+        'recipe_pub_date_id_idx', 'favorite_user_recipe_idx',
+        'shoppinglist_user_recipe_idx'),
+    '/api/recipes/?limit=10&cursor=': ('recipe_pub_date_id_idx', ),
+    '/api/recipes/?limit=10&tags={tag}': (),
+    '/api/recipes/?limit=10&author={author}': (
+        'recipe_author_pub_date_idx', ),
+    '/api/recipes/?limit=10&is_favorited=1': (),
+    '/api/recipes/?limit=10&is_in_shopping_cart=1': (),
+    '/api/recipes/?limit=10&search={ingredient}': (),
+    '/api/recipes/{recipe}/': (),
+    '/api/users/?limit=10': (),
+    '/api/users/subscriptions/?limit=10&recipes_limit=3': (
+        'recipe_author_pub_date_idx', ),
+    '/api/recipes/download_shopping_cart/': (),
+    '/api/tags/': (),
+    '/api/ingredients/?name={ingredient}': (),
+}
+EXPLAIN = {
+    'sqlite': 'EXPLAIN QUERY PLAN {0}',
+    'postgresql': 'EXPLAIN {0}',
+}
+EXPLAIN_SETUP = {
+    'postgresql': 'SET LOCAL enable_seqscan = off',
+}
+SEQ_SCAN = {
+    'sqlite': re.compile(r'^SCAN (?:TABLE )?"?(\w+)"?(?: AS \w+)?$'),
+    'postgresql': re.compile(r'Seq Scan on "?(\w+)"?'),
+}
+CATALOG_TAGS = (
+    {'name': 'Завтрак', 'color': '#333333', 'slug': 'morning'},
+    {'name': 'Ужин', 'color': '#222222', 'slug': 'dinner'},
+    {'name': 'Обед', 'color': '#111111', 'slug': 'breakfast'},
+    {'name': 'Полдник', 'color': '#444444', 'slug': 'snack'},
+    {'name': 'Полдник', 'color': '#666666', 'slug': 'brunch'},
+    {'name': 'Обед', 'color': '#555555', 'slug': 'lunch'},
+)
+CATALOG_REPORT = 'Добавлено: 1, обновлено: 1, пропущено: 4'
+IMAGE = ('data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJ'
+         'AAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg==')
+
+
+@override_settings(RECIPE_IMAGE_WORKERS=0)
+class RecipeTestCase(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        media_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        cls.addClassCleanup(media.disable)
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        image = BytesIO()
+        Image.new('RGB', (640, 480), '#E26C2D').save(image, 'PNG')
+        cls.image = default_storage.save('recipe/test.png', SimpleUploadedFile(
+            'test.png', image.getvalue(), 'image/png'))
+        cls.user = User.objects.create_user(
+            email='reader@example.com', username='reader',
+            first_name='Читатель', last_name='Тестов', password='secret-42')
+        author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Автор', last_name='Тестов', password='secret-42')
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Тег {number}', color=f'#00000{number}',
+                slug=f'tag{number}')
+            for number in range(3)]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Продукт {number}', measurement_unit='г')
+            for number in range(30)]
+        cls.recipes = []
+        for number in range(20):
+            recipe = Recipe.objects.create(
+                author=author, name=f'Рецепт {number}', text='Текст',
+                cooking_time=10, image=cls.image)
+            recipe.tags.set(cls.tags[:number % 3 + 1])
+            Composition.objects.bulk_create(
+                Composition(recipe=recipe, ingredients=ingredient, amount=10)
+                for ingredient in cls.ingredients[:number % 5 + 1])
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        caches['default'].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+class RecipeQueriesTest(RecipeTestCase):
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_recipe_list_queries_do_not_grow_with_page_size(self):
+        self.get('/api/recipes/?limit=1')
+        for limit in (1, 5, 20):
+            with self.subTest(limit=limit), self.assertNumQueries(
+                    RECIPE_LIST_QUERIES):
+                response = self.get(f'/api/recipes/?limit={limit}')
+            self.assertEqual(len(response.data['results']), limit)
+
+    def test_recipe_detail_queries_do_not_depend_on_recipe_size(self):
+        self.get(f'/api/recipes/{self.recipes[0].id}/')
+        for recipe in self.recipes[:5]:
+            with self.subTest(recipe=recipe.id), self.assertNumQueries(
+                    RECIPE_DETAIL_QUERIES):
+                self.get(f'/api/recipes/{recipe.id}/')
+
+
+class SubscriptionsQueriesTest(RecipeTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.authors = []
+        for number in range(6):
+            author = User.objects.create_user(
+                email=f'follow{number}@example.com',
+                username=f'follow{number}', first_name='Автор',
+                last_name=f'Номер {number}', password='secret-42')
+            author.created_recipes = [
+                Recipe.objects.create(
+                    author=author, name=f'Рецепт {number}-{index}',
+                    text='Текст', cooking_time=index + 1,
+                    image=cls.image)
+                for index in range(4)]
+            cls.authors.append(author)
+
+    def get_expected(self, authors):
+        return [{
+            'email': author.email,
+            'id': author.id,
+            'username': author.username,
+            'first_name': author.first_name,
+            'last_name': author.last_name,
+            'is_subscribed': True,
+            'recipes': [{
+                'id': recipe.id,
+                'name': recipe.name,
+                'image': recipe.image.url,
+                'images': {},
+                'cooking_time': recipe.cooking_time,
+            } for recipe in author.created_recipes[:-3:-1]],
+            'recipes_count': 4,
+        } for author in authors]
+
+    def test_subscriptions_queries_do_not_grow_with_authors(self):
+        url = '/api/users/subscriptions/?limit=10&recipes_limit=2'
+        for count in (3, 6):
+            Follow.objects.bulk_create(
+                Follow(user=self.user, following=author)
+                for author in self.authors[count - 3:count])
+            with self.subTest(authors=count), self.assertNumQueries(
+                    SUBSCRIPTIONS_QUERIES):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['count'], count)
+            self.assertEqual(
+                response.data['results'],
+                self.get_expected(self.authors[:count]))
+
+
+class CursorPaginationTest(RecipeTestCase):
+
+    def walk(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [recipe['id'] for recipe in response.data['results']]
+            url = response.data['next']
+        return ids
+
+    def test_cursor_walk_matches_offset_pages(self):
+        pages = [
+            self.client.get(f'/api/recipes/?limit=3&page={page}').data
+            for page in range(1, 8)]
+        self.assertEqual(
+            self.walk('/api/recipes/?limit=3&cursor='),
+            [recipe['id'] for page in pages for recipe in page['results']])
+
+    def test_next_link_only_when_more_recipes(self):
+        response = self.client.get('/api/recipes/?limit=19&cursor=')
+        self.assertIsNotNone(response.data['next'])
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNone(response.data['next'])
+        response = self.client.get('/api/recipes/?limit=20&cursor=')
+        self.assertIsNone(response.data['next'])
+
+    def test_invalid_cursor_returns_404(self):
+        for cursor in (
+                'не-курсор', urlsafe_b64encode(b'[1]').decode(),
+                urlsafe_b64encode(json.dumps(
+                    ['не-дата', '1']).encode()).decode()):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.client.get(
+                    f'/api/recipes/?limit=3&cursor={cursor}').status_code,
+                    404)
+
+    def test_pub_date_ties_are_broken_by_id(self):
+        Recipe.objects.update(pub_date=self.recipes[0].pub_date)
+        self.assertEqual(
+            self.walk('/api/recipes/?limit=3&cursor='),
+            sorted((recipe.id for recipe in self.recipes), reverse=True))
+
+
+class RecipeWriteQueriesTest(RecipeTestCase):
+
+    def get_payload(self, ingredients):
+        return {
+            'name': f'Новый рецепт {len(ingredients)}', 'text': 'Текст',
+            'cooking_time': 5,
+            'image': IMAGE, 'tags': [tag.id for tag in self.tags[:2]],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': number + 1}
+                for number, ingredient in enumerate(ingredients)]}
+
+    def create(self, ingredients):
+        response = self.client.post(
+            '/api/recipes/', self.get_payload(ingredients), format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def test_create_queries_do_not_depend_on_ingredients(self):
+        self.create(self.ingredients[:1])
+        for count in (2, 20):
+            with self.subTest(ingredients=count), self.assertNumQueries(
+                    RECIPE_CREATE_QUERIES), self.captureOnCommitCallbacks(
+                        execute=True):
+                self.create(self.ingredients[:count])
+
+    def test_saved_image_gets_variants(self):
+        recipe = self.recipes[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.save()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image_variants['source'], self.image)
+        self.assertTrue(all(
+            default_storage.exists(name)
+            for formats in recipe.image_variants['sizes'].values()
+            for name in formats.values()))
+        with Image.open(default_storage.path(
+                recipe.image_variants['sizes']['small']['jpeg'])) as image:
+            self.assertEqual(image.size, (320, 240))
+
+    def test_created_recipe_is_searchable_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe_id = self.create(self.ingredients[5:7])
+        response = self.client.get(
+            f'/api/recipes/?search={self.ingredients[6].name}')
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            [recipe_id])
+
+    def test_update_queries_do_not_depend_on_ingredients(self):
+        for count in (2, 20):
+            recipe_id = self.create(self.ingredients[:count])
+            with self.subTest(ingredients=count), self.assertNumQueries(
+                    RECIPE_UPDATE_QUERIES), self.captureOnCommitCallbacks(
+                        execute=True):
+                response = self.client.patch(
+                    f'/api/recipes/{recipe_id}/', self.get_payload(
+                        self.ingredients[1:count + 1]), format='json')
+            self.assertEqual(response.status_code, 200)
+
+
+class CountersSaveTest(RecipeTestCase):
+
+    def test_full_save_keeps_counters(self):
+        recipe = self.recipes[0]
+        author = User.objects.get(pk=recipe.author_id)
+        stale_recipe = Recipe.objects.get(pk=recipe.id)
+        self.client.post(f'/api/users/{author.id}/subscribe/')
+        self.client.post(f'/api/recipes/{recipe.id}/favorite/')
+        author.set_password('secret-43')
+        author.save()
+        stale_recipe.text = 'Новый текст'
+        stale_recipe.save()
+        author.refresh_from_db()
+        recipe.refresh_from_db()
+        self.assertEqual(
+            (author.subscribers_count, author.recipes_count), (1, 20))
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(recipe.text, 'Новый текст')
+
+
+class InstrumentationTest(RecipeTestCase):
+
+    def test_server_timing_is_disabled_by_default(self):
+        response = self.client.get('/api/recipes/?limit=5')
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(INSTRUMENTATION_SERVER_TIMING=True)
+    def test_server_timing_splits_serialize_and_render(self):
+        response = self.client.get('/api/recipes/?limit=5')
+        timings = dict(
+            part.split(';dur=')
+            for part in response['Server-Timing'].split(', '))
+        self.assertEqual(timings.keys(), {
+            'db', 'view', 'serialize', 'render', 'total'})
+        self.assertGreater(float(timings['serialize']), 0)
+
+
+class BatchRelationsTest(RecipeTestCase):
+
+    def test_batch_favorites_keep_counters(self):
+        ids = [recipe.id for recipe in self.recipes[:3]]
+        for method, status, count in (
+                ('post', 201, 1), ('post', 400, 1),
+                ('delete', 204, 0), ('delete', 400, 0)):
+            with self.subTest(method=method, status=status):
+                response = getattr(self.client, method)(
+                    '/api/recipes/favorite/', {'ids': ids}, format='json')
+                self.assertEqual(
+                    [result['status'] for result in response.data['results']],
+                    [status] * len(ids))
+                self.assertEqual(list(Recipe.objects.filter(
+                    id__in=ids).values_list('favorites_count', flat=True)),
+                    [count] * len(ids))
+        self.assertFalse(Favorite.objects.filter(user=self.user).exists())
+
+    def test_single_relations_keep_counters(self):
+        recipe, author = self.recipes[0], self.recipes[0].author
+        for method, status, count in (
+                ('post', 201, 1), ('post', 400, 1),
+                ('delete', 204, 0), ('delete', 400, 0)):
+            with self.subTest(method=method, status=status):
+                for url in (f'/api/recipes/{recipe.id}/favorite/',
+                            f'/api/recipes/{recipe.id}/shopping_cart/',
+                            f'/api/users/{author.id}/subscribe/'):
+                    self.assertEqual(
+                        getattr(self.client, method)(url).status_code, status)
+                recipe.refresh_from_db()
+                author.refresh_from_db()
+                self.assertEqual(recipe.favorites_count, count)
+                self.assertEqual(author.subscribers_count, count)
+                self.assertEqual(ShoppingListIngredient.objects.filter(
+                    user=self.user, amount__gt=0).count(),
+                    count * recipe.compositions.count())
+
+
+class TokenCacheTest(RecipeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def get_cached_token(self, cache=token_cache):
+        return cache.get(self.token.key, cache.get_version(self.token.key))
+
+    def test_cached_user_has_no_password_and_counters(self):
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+        user = self.get_cached_token().user
+        self.assertEqual(user.get_deferred_fields(), {
+            'password', *User.counter_fields})
+
+    def test_invalidation_reaches_other_processes(self):
+        self.client.get('/api/users/me/')
+        other = TokenCache()
+        other.set(
+            self.token.key, other.get_version(self.token.key),
+            self.get_cached_token())
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.filter(pk=self.user.pk).update(is_active=False)
+            self.user.refresh_from_db()
+            self.user.save()
+        self.assertIsNone(self.get_cached_token(other))
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+
+@override_settings(FEED_FANOUT_LIMIT=1)
+class FeedTest(RecipeTestCase):
+
+    def test_feed_keeps_recipes_of_demoted_author(self):
+        author = self.recipes[0].author
+        follower = User.objects.create_user(
+            email='follower@example.com', username='follower',
+            first_name='Подписчик', last_name='Тестов', password='secret-42')
+        client = APIClient()
+        client.force_authenticate(follower)
+        for user_client in (self.client, client):
+            user_client.post(f'/api/users/{author.id}/subscribe/')
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = Recipe.objects.create(
+                author=author, name='Рецепт популярного автора',
+                text='Текст', cooking_time=10, image=self.image)
+        self.assertFalse(FeedEntry.objects.filter(recipe=recipe).exists())
+        self.client.delete(f'/api/users/{author.id}/subscribe/')
+        expected = list(Recipe.objects.filter(author=author).order_by(
+            '-pub_date', '-id').values_list('id', flat=True)[:10])
+        self.assertEqual(FeedEntry.get_feed(follower, None, 10), expected)
+        self.assertEqual(FeedEntry.objects.filter(
+            user=follower, recipe=recipe).count(), 1)
+
+
+@skipUnless(connection.vendor in EXPLAIN, 'EXPLAIN не поддерживается')
+class QueryPlansTest(RecipeTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Follow.objects.create(user=cls.user, following=cls.recipes[0].author)
+        Favorite.objects.create(user=cls.user, repice=cls.recipes[0])
+        ShoppingList.objects.create(user=cls.user, repice=cls.recipes[1])
+
+    def get_plan(self, sql):
+        with connection.cursor() as cursor:
+            if (setup := EXPLAIN_SETUP.get(connection.vendor)):
+                cursor.execute(setup)
+            cursor.execute(EXPLAIN[connection.vendor].format(sql))
+            return [str(row[-1]).strip() for row in cursor.fetchall()]
+
+    def test_endpoints_use_indexes(self):
+        for cache in reference_caches.values():
+            cache.invalidate()
+        tables = connection.introspection.table_names()
+        recipe = self.recipes[0]
+        for url, indexes in EXPLAIN_ENDPOINTS.items():
+            url = url.format(
+                tag=self.tags[0].slug, author=recipe.author_id,
+                recipe=recipe.id, ingredient=self.ingredients[0].name[:2])
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as context:
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                plans = [
+                    self.get_plan(query['sql'])
+                    for query in context.captured_queries
+                    if query['sql'].lstrip().upper().startswith('SELECT')]
+                scans = {
+                    match[1] for plan in plans for line in plan
+                    if (match := SEQ_SCAN[connection.vendor].search(line))
+                    and match[1] in tables}
+                self.assertEqual(scans, set())
+                for index in indexes:
+                    self.assertIn(index, str(plans))
+
+
+class ImportCatalogTest(TestCase):
+
+    def test_tags_colliding_on_any_unique_field_are_skipped(self):
+        Tag.objects.bulk_create((
+            Tag(name='Завтрак', color='#111111', slug='breakfast'),
+            Tag(name='Обед', color='#222222', slug='lunch')))
+        stdout = StringIO()
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'tags.json'
+            path.write_text(json.dumps(CATALOG_TAGS), encoding='utf-8')
+            call_command('import_catalog', 'tags', str(path), stdout=stdout)
+        self.assertIn(CATALOG_REPORT, stdout.getvalue())
+        self.assertEqual(
+            set(Tag.objects.values_list('name', 'color', 'slug')), {
+                ('Завтрак', '#111111', 'breakfast'),
+                ('Обед', '#555555', 'lunch'),
+                ('Полдник', '#444444', 'snack')})
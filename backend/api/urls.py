@@ -2,7 +2,8 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from api.views import IngredientViewSet, RecipeViewSet, TagViewSet, UserViewSet
+from api.views import (IngredientViewSet, MetricsView, RecipeViewSet,
+                       TagViewSet, UserViewSet)
 
 app_name = 'api'
 
@@ -13,6 +14,7 @@ router_version_1.register('ingredients', IngredientViewSet, 'ingredients')
 router_version_1.register('recipes', RecipeViewSet, 'recipes')
 
 urlpatterns = [
+    path('metrics/', MetricsView.as_view(), name='metrics'),
     path('', include(router_version_1.urls)),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
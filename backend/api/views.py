@@ -1,27 +1,79 @@
+from collections import defaultdict
 from datetime import date
+from hashlib import md5
+from itertools import chain
 
-from django.http import FileResponse
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
 from django_filters import rest_framework as filters
 from djoser.views import UserViewSet
 from rest_framework import permissions, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from api.paginators import LimitPagination
-from api.serializers import (CreateRecipeSerializer, FavoriteSerializer,
-                             FollowSerializator, IngredientSerializer,
+from api.authentication import token_cache
+from api.caches import (AnonymousResponseCacheMixin, ReferenceCacheMixin,
+                        reference_caches, response_cache)
+from api.instrumentation import export_cache_stats, request_metrics
+from api.paginators import FeedPagination, LimitPagination
+from api.renderers import (CSVShoppingListRenderer, MetricsRenderer,
+                           PDFShoppingListRenderer, TextShoppingListRenderer)
+from api.serializers import (BatchSerializer, CreateRecipeSerializer,
+                             FavoriteSerializer, FollowSerializator,
+                             IngredientSerializer,
                              RecipeForFollowwerSerializer, RecipeSerializer,
                              TagSerializer, UserSerializer)
 from recipes.filters import IngredientFilter, RecipeFilter, TagFilter
-from recipes.models import (Composition, Favorite, Follow, Ingredient,
-                            Recipe, ShoppingList, Tag, User)
+from recipes.models import (Favorite, Follow, Ingredient, Recipe,
+                            ShoppingList, ShoppingListIngredient, Tag, User)
+from recipes.relations import add_relations, remove_relations
 
 
 ERROR_MESSAGE_NOT_SUBSCRIBE = 'Подписка не найдена.'
 ALREADY_ADDED_TO_FAVORITES = 'Рецепт уже добавлен в избранное.'
 ALREADY_ADDED_TO_SHOP_LIST = 'Рецепт уже добавлен в список покупок.'
-TEMPLATE_SHOP_LIST = '{0}: {1} {2} '
+SHOP_LIST_FILENAME = 'attachment; filename="{0}shopping_list.{1}"'
+SHOP_LIST_ETAG = '{0}:{1}:'
+RECIPE_NOT_FOUND = 'Рецепт не найден.'
+USER_NOT_FOUND = 'Пользователь не найден.'
+NOT_IN_FAVORITES = 'Рецепта нет в избранном.'
+NOT_IN_SHOP_LIST = 'Рецепта нет в списке покупок.'
+ALREADY_SUBSCRIBED = 'Вы уже подписаны на этого автора.'
+SELF_SUBSCRIBE = 'Нельзя подписаться на самого себя.'
+
+
+def change_relations(request, model, queryset, serialize, messages,
+                     exclude=()):
+    serializer = BatchSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    ids = list(dict.fromkeys(serializer.validated_data['ids']))
+    found = queryset.in_bulk(ids)
+    not_found, exists, missing, invalid = messages
+    valid = [pk for pk in ids if pk in found and pk not in exclude]
+    if request.method == 'DELETE':
+        changed = dict.fromkeys(remove_relations(
+            model, request.user.id, valid), {})
+        status, unchanged = 204, missing
+    else:
+        created = add_relations(model, request.user.id, valid)
+        changed = {
+            pk: {'data': data}
+            for pk, data in zip(created, serialize(
+                [found[pk] for pk in created]))}
+        status, unchanged = 201, exists
+    results = []
+    for pk in ids:
+        if pk not in found:
+            results.append({'id': pk, 'status': 404, 'errors': not_found})
+        elif pk in exclude:
+            results.append({'id': pk, 'status': 400, 'errors': invalid})
+        elif pk in changed:
+            results.append({'id': pk, 'status': status, **changed[pk]})
+        else:
+            results.append({'id': pk, 'status': 400, 'errors': unchanged})
+    return Response({'results': results})
 
 
 class UserViewSet(UserViewSet):
@@ -29,6 +81,12 @@ class UserViewSet(UserViewSet):
     serializer_class = UserSerializer
     pagination_class = LimitPagination
 
+    @property
+    def cursor_ordering(self):
+        if self.action == 'subscriptions':
+            return ('id', )
+        return ('username', 'id')
+
     @action(
         methods=['GET'],
         detail=False,
@@ -37,13 +95,27 @@ class UserViewSet(UserViewSet):
     def subscriptions(self, request):
         return self.get_paginated_response(
             FollowSerializator(
-                self.paginate_queryset(
-                    request.user.follower.all()),
+                self.add_recipes_preview(
+                    self.paginate_queryset(
+                        request.user.follower.select_related(
+                            'following').order_by('id')),
+                    request.query_params.get('recipes_limit')),
                 context={
                     'request': request,
                 }, many=True
             ).data)
 
+    @staticmethod
+    def add_recipes_preview(follows, recipes_limit):
+        previews = defaultdict(list)
+        for recipe in Recipe.objects.latest_by_authors(
+                [follow.following_id for follow in follows],
+                int(recipes_limit) if recipes_limit else None):
+            previews[recipe.author_id].append(recipe)
+        for follow in follows:
+            follow.recipes_preview = previews[follow.following_id]
+        return follows
+
     @action(
         methods=['POST', 'DELETE'],
         detail=True
@@ -52,45 +124,72 @@ class UserViewSet(UserViewSet):
         following = get_object_or_404(User, pk=id)
         user = request.user
         if request.method == 'POST':
+            if following == user:
+                return Response({'errors': SELF_SUBSCRIBE}, status=400)
+            if not add_relations(Follow, user.id, [following.id]):
+                return Response({'errors': ALREADY_SUBSCRIBED}, status=400)
             return Response(
                 FollowSerializator(
-                    Follow.objects.create(
-                        user=user, following=following),
+                    Follow(user=user, following=following),
                     context={'request': request}
                 ).data, status=201
             )
-        follow = Follow.objects.filter(user=user, following=following)
-        if follow.exists():
-            follow.delete()
+        if remove_relations(Follow, user.id, [following.id]):
             return Response(status=204)
         return Response({'error': ERROR_MESSAGE_NOT_SUBSCRIBE}, status=400)
 
+    @action(
+        methods=['POST', 'DELETE'],
+        detail=False,
+        url_path='subscribe',
+        permission_classes=(permissions.IsAuthenticated,)
+    )
+    def subscribe_batch(self, request):
+        return change_relations(
+            request, Follow, User.objects.all(),
+            lambda authors: FollowSerializator(
+                self.add_recipes_preview(
+                    [Follow(user=request.user, following=author)
+                     for author in authors],
+                    request.query_params.get('recipes_limit')),
+                context={'request': request}, many=True).data,
+            (USER_NOT_FOUND, ALREADY_SUBSCRIBED, ERROR_MESSAGE_NOT_SUBSCRIBE,
+             SELF_SUBSCRIBE),
+            exclude={request.user.id})
+
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(ReferenceCacheMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (permissions.AllowAny, )
     pagination_class = None
     filter_backends = (filters.DjangoFilterBackend,)
     filterset_class = TagFilter
+    cache_namespace = 'tags'
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ReferenceCacheMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (permissions.AllowAny, )
     pagination_class = None
     filter_backends = (filters.DjangoFilterBackend,)
     filterset_class = IngredientFilter
+    cache_namespace = 'ingredients'
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(AnonymousResponseCacheMixin, viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     permission_classes = (permissions.IsAuthenticatedOrReadOnly, )
     filter_backends = (filters.DjangoFilterBackend,)
     filterset_class = RecipeFilter
     pagination_class = LimitPagination
 
+    def get_queryset(self):
+        if self.request.method in permissions.SAFE_METHODS:
+            return Recipe.objects.for_feed()
+        return Recipe.objects.all()
+
     def get_serializer_class(self):
         if self.request.method in permissions.SAFE_METHODS:
             return RecipeSerializer
@@ -99,42 +198,101 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         return serializer.save(author=self.request.user)
 
-    def add_or_delete(self, model, message, request, pk, serializers):
+    def add_or_delete(self, model, messages, request, pk, serializers):
         recipe = get_object_or_404(Recipe, id=pk)
+        exists, missing = messages
         if request.method == 'DELETE':
-            model.objects.get(
-                user=request.user, repice=recipe).delete()
+            if not remove_relations(model, request.user.id, [recipe.id]):
+                return Response({'errors': missing}, status=400)
             return Response(status=204)
-        _, create = model.objects.get_or_create(
-            user=request.user, repice=recipe)
-        if not create:
-            return Response({'errors': message}, status=400)
+        if not add_relations(model, request.user.id, [recipe.id]):
+            return Response({'errors': exists}, status=400)
         serializer = serializers(recipe)
         return Response(serializer.data, status=201)
 
+    def add_or_delete_many(self, model, messages, request, serializers):
+        return change_relations(
+            request, model, Recipe.objects.all(),
+            lambda recipes: serializers(recipes, many=True).data,
+            (RECIPE_NOT_FOUND, *messages, None))
+
     @action(methods=['POST', 'DELETE'], detail=True)
     def favorite(self, request, pk):
         return self.add_or_delete(
-            Favorite, ALREADY_ADDED_TO_FAVORITES, request, pk,
-            FavoriteSerializer)
+            Favorite, (ALREADY_ADDED_TO_FAVORITES, NOT_IN_FAVORITES),
+            request, pk, FavoriteSerializer)
 
     @action(methods=['POST', 'DELETE'], detail=True)
     def shopping_cart(self, request, pk):
         return self.add_or_delete(
-            ShoppingList, ALREADY_ADDED_TO_SHOP_LIST, request, pk,
-            RecipeForFollowwerSerializer)
+            ShoppingList, (ALREADY_ADDED_TO_SHOP_LIST, NOT_IN_SHOP_LIST),
+            request, pk, RecipeForFollowwerSerializer)
 
-    def create_shopping_list(self, ingredients):
-        return ''.join(
-            TEMPLATE_SHOP_LIST.format(
-                ingredient["ingredients__name"],
-                ingredient["ingredients__measurement_unit"],
-                ingredient["value"]) for ingredient in ingredients)
+    @action(methods=['POST', 'DELETE'], detail=False, url_path='favorite')
+    def favorite_batch(self, request):
+        return self.add_or_delete_many(
+            Favorite, (ALREADY_ADDED_TO_FAVORITES, NOT_IN_FAVORITES),
+            request, FavoriteSerializer)
 
-    @action(methods=['GET'], detail=False)
+    @action(
+        methods=['POST', 'DELETE'], detail=False, url_path='shopping_cart')
+    def shopping_cart_batch(self, request):
+        return self.add_or_delete_many(
+            ShoppingList, (ALREADY_ADDED_TO_SHOP_LIST, NOT_IN_SHOP_LIST),
+            request, RecipeForFollowwerSerializer)
+
+    @action(
+        methods=['GET'],
+        detail=False,
+        permission_classes=(permissions.IsAuthenticated, ),
+        pagination_class=FeedPagination
+    )
+    def feed(self, request):
+        return self.get_paginated_response(self.get_serializer(
+            self.paginate_queryset(self.get_queryset()), many=True).data)
+
+    @action(
+        methods=['GET'],
+        detail=False,
+        permission_classes=(permissions.IsAuthenticated, ),
+        renderer_classes=(
+            TextShoppingListRenderer, CSVShoppingListRenderer,
+            PDFShoppingListRenderer)
+    )
     def download_shopping_cart(self, request):
-        return FileResponse(
-            self.create_shopping_list(
-                Composition.get_count_ingredients(request.user)
-            ), content_type='text/plain',
-            filename=f'{date.today()}shopping_list.txt')
+        ingredients = ShoppingListIngredient.get_count_ingredients(
+            request.user)
+        renderer = request.accepted_renderer
+        checksum = md5(SHOP_LIST_ETAG.format(
+            renderer.format,
+            reference_caches['ingredients'].get_version()).encode())
+        for ingredient, amount in ShoppingListIngredient.get_totals(
+                request.user):
+            checksum.update(f'{ingredient}:{amount};'.encode())
+        etag = f'"{checksum.hexdigest()}"'
+        if (response := get_conditional_response(request, etag=etag)):
+            return response
+        response = StreamingHttpResponse(
+            renderer.export(ingredients.iterator()),
+            content_type=(
+                f'{renderer.media_type}; charset={renderer.charset}'
+                if renderer.charset else renderer.media_type))
+        response['ETag'] = etag
+        response['Content-Disposition'] = SHOP_LIST_FILENAME.format(
+            date.today(), renderer.format)
+        return response
+
+
+class MetricsView(APIView):
+    permission_classes = (permissions.IsAdminUser,)
+    renderer_classes = (MetricsRenderer,)
+
+    def get(self, request):
+        return Response(chain(
+            request_metrics.export(),
+            export_cache_stats({
+                **{f'reference_{namespace}': cache.stats
+                   for namespace, cache in reference_caches.items()},
+                'response': response_cache.stats,
+                'token': token_cache.stats,
+            })))
@@ -36,6 +36,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -84,6 +85,15 @@ else:
         }
     }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='foodgram'),
+    }
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -133,7 +143,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.TokenAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
@@ -163,4 +173,53 @@ RESERVED_NAMES = (
 )
 USERNAME_PATTERN = r'[\w.@+-]+'
 COLOR_PATTERN = r'^#[a-zA-Z0-9]{6}$'
-MAX_LENGTH_EMAIL = 254
\ No newline at end of file
+MAX_LENGTH_EMAIL = 254
+
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
+
+CACHE_VERSION_TIMEOUT = int(os.getenv('CACHE_VERSION_TIMEOUT', default=60))
+
+REFERENCE_CACHE = 'default'
+REFERENCE_CACHE_TIMEOUT = 60 * 60 * 24
+REFERENCE_CACHE_LOCAL_SIZE = 1024
+
+USER_FLAGS_CACHE = 'default'
+USER_FLAGS_CACHE_TIMEOUT = int(
+    os.getenv('USER_FLAGS_CACHE_TIMEOUT', default=60))
+
+RESPONSE_CACHE = 'default'
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', default=600))
+RESPONSE_CACHE_LOCK_TIMEOUT = 10
+RESPONSE_CACHE_LOCK_WAIT = float(
+    os.getenv('RESPONSE_CACHE_LOCK_WAIT', default=2))
+
+TOKEN_CACHE = 'default'
+TOKEN_CACHE_SHARED = bool(
+    os.getenv('TOKEN_CACHE_SHARED', default=False) == 'True')
+TOKEN_CACHE_TIMEOUT = 60 * 60
+TOKEN_CACHE_LOCAL_SIZE = 10000
+TOKEN_CACHE_LOCAL_TIMEOUT = int(
+    os.getenv('TOKEN_CACHE_LOCAL_TIMEOUT', default=30))
+
+RECIPE_SEARCH_CONFIG = os.getenv('RECIPE_SEARCH_CONFIG', default='russian')
+
+RECIPE_IMAGE_SIZES = {
+    'small': (320, 320),
+    'medium': (960, 960),
+}
+RECIPE_IMAGE_MAX_PIXELS = 40 * 1000 * 1000
+RECIPE_IMAGE_WORKERS = int(os.getenv('RECIPE_IMAGE_WORKERS', default=2))
+
+FEED_FANOUT_LIMIT = 1000
+FEED_MAX_LENGTH = 500
+
+RELATIONS_BATCH_MAX_SIZE = 100
+
+INSTRUMENTATION_SAMPLE_RATE = float(
+    os.getenv('INSTRUMENTATION_SAMPLE_RATE', default=1))
+INSTRUMENTATION_SLOW_REQUEST_MS = int(
+    os.getenv('INSTRUMENTATION_SLOW_REQUEST_MS', default=500))
+INSTRUMENTATION_SERVER_TIMING = bool(
+    os.getenv('INSTRUMENTATION_SERVER_TIMING', default=False) == 'True')
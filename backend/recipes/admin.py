@@ -1,15 +1,21 @@
+import re
+
 from django.contrib import admin
 from django.contrib.auth.admin import Group, UserAdmin
-from django.db.models import Max, Min
+from django.db.models import Prefetch
 from django.utils.html import format_html
 
 from recipes.models import (
-    Composition, Favorite, Follow, Ingredient, Recipe, ShoppingList, Tag, User)
+    Composition, Favorite, Follow, Ingredient, Recipe, ShoppingList,
+    ShoppingListIngredient, Tag, User)
+from recipes.search import recipe_search_index
 
 admin.site.unregister(Group)
 LENGT_INGREDIENTS = 50
 IMAGE_RECIPE = '<img src="{}" width="75px" heigth="75px">'
 COLOR_VIEW = '<span  style="background: {};">&nbsp&nbsp&nbsp&nbsp&nbsp</span>'
+COOKING_TIME_RANGE = '{0}-{1}'
+COOKING_TIME_PATTERN = r'(?P<start>\d+)-(?P<end>\d+)'
 
 
 @admin.register(Tag)
@@ -41,27 +47,21 @@ class CookingTimeFilter(admin.SimpleListFilter):
     parameter_name = 'cooking_time'
 
     def lookups(self, request, model_admin):
-        if not (queryset := model_admin.get_queryset(request)):
-            return ()
-        min_value, max_value = queryset.aggregate(
-            Min("cooking_time"),
-            Max("cooking_time")).values()
-        if (step := (max_value - min_value) // 3) == 0:
+        if not (buckets := Recipe.get_cooking_time_buckets()):
             return ()
-        first_threshold = min_value + step
-        secound_threshold = min_value + step * 2
-        return (
-            ((min_value, first_threshold - 1), (
-                f'Быстрое, до {first_threshold - 1} минут')),
-            ((first_threshold, secound_threshold - 1), (
-                f'Среднее {first_threshold}-{secound_threshold - 1} минут')),
-            ((secound_threshold, max_value), (
-                f'Медленное, больше {secound_threshold} минут')),
-        )
+        _, (medium_from, medium_to), (slow, _) = buckets
+        return tuple(
+            (COOKING_TIME_RANGE.format(*bucket), title)
+            for bucket, title in zip(buckets, (
+                f'Быстрое, до {medium_from - 1} минут',
+                f'Среднее {medium_from}-{medium_to} минут',
+                f'Медленное, больше {slow} минут')))
 
     def queryset(self, _, queryset):
-        if self.value():
-            return queryset.filter(cooking_time__range=eval(self.value()))
+        if self.value() and (
+                match := re.fullmatch(COOKING_TIME_PATTERN, self.value())):
+            return queryset.filter(cooking_time__range=(
+                int(match['start']), int(match['end'])))
         return queryset
 
 
@@ -71,12 +71,34 @@ class RecipeAdmin(admin.ModelAdmin):
         'name', 'get_count_in_favorite', 'author', 'get_image', 'get_tags',
         'get_ingredients')
     list_filter = ('tags', CookingTimeFilter,)
-    search_fields = ('author__username', 'name', 'tags__name')
+    search_fields = ('=author__username', '=tags__name')
     inlines = (IngredientInline,)
+    list_select_related = ('author', )
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related(
+            'tags',
+            Prefetch(
+                'compositions',
+                queryset=Composition.objects.select_related('ingredients')))
+
+    def save_related(self, request, form, formsets, change):
+        old_amounts = ShoppingListIngredient.get_recipe_amounts(
+            form.instance.id)
+        super().save_related(request, form, formsets, change)
+        ShoppingListIngredient.recipe_changed(form.instance, old_amounts)
+
+    def get_search_results(self, request, queryset, search_term):
+        found, use_distinct = super().get_search_results(
+            request, queryset, search_term)
+        if search_term:
+            found |= recipe_search_index.filter(queryset, search_term)
+        return found, use_distinct
 
     @admin.display(description='В избраном')
     def get_count_in_favorite(self, recipe):
-        return recipe.favorites.count()
+        return recipe.favorites_count
 
     @admin.display(description='Теги')
     def get_tags(self, recipe):
@@ -102,16 +124,22 @@ class RecipeAdmin(admin.ModelAdmin):
 class CountIngredientAdmin(admin.ModelAdmin):
     list_display = ('recipe', 'ingredients', 'amount')
     search_fields = ('recipe__name', )
+    list_select_related = ('recipe', 'ingredients')
+    show_full_result_count = False
 
 
 @admin.register(Favorite)
 class FavoriteAdmin(admin.ModelAdmin):
-    search_fields = ('recipe__name', 'user_username')
+    search_fields = ('repice__name', 'user__username')
+    list_select_related = ('user', 'repice')
+    show_full_result_count = False
 
 
 @admin.register(ShoppingList)
 class ShoppingListAdmin(admin.ModelAdmin):
-    search_fields = ('recipe__name', 'user_username')
+    search_fields = ('repice__name', 'user__username')
+    list_select_related = ('user', 'repice')
+    show_full_result_count = False
 
 
 @admin.register(User)
@@ -120,6 +148,7 @@ class UsersAdmin(UserAdmin):
         'username', 'email', 'get_full_name', 'get_count_recipe',
         'get_subscribers', 'get_subscriptions', 'is_staff')
     search_fields = ('username', 'email')
+    show_full_result_count = False
 
     @admin.display(description='Фамилия Имя')
     def get_full_name(self, user):
@@ -127,21 +156,23 @@ class UsersAdmin(UserAdmin):
 
     @admin.display(description='Подписчики')
     def get_subscribers(self, user):
-        return user.following.count()
+        return user.subscribers_count
 
     @admin.display(description='Подписки')
     def get_subscriptions(self, user):
-        return user.follower.count()
+        return user.subscriptions_count
 
     @admin.display(description='Число рецептов')
     def get_count_recipe(self, user):
-        return user.recipes.count()
+        return user.recipes_count
 
 
 @admin.register(Follow)
 class FollowAdmin(admin.ModelAdmin):
     list_display = ('get_follow_title', )
     search_fields = ('user__username', 'following__username')
+    list_select_related = ('user', 'following')
+    show_full_result_count = False
 
     @admin.display(description='Подписки')
     def get_follow_title(self, follow, ):
@@ -0,0 +1,85 @@
+import time
+from bisect import bisect_left
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import cache
+
+from recipes.models import Ingredient
+
+VERSION_KEY = 'ingredients:autocomplete:version'
+
+
+class IngredientIndex:
+
+    def __init__(self):
+        self.index = ((), (), {})
+        self.version = None
+        self.lock = Lock()
+
+    @staticmethod
+    def get_version():
+        if (version := cache.get(VERSION_KEY)) is None:
+            cache.add(
+                VERSION_KEY, time.time_ns(), settings.CACHE_VERSION_TIMEOUT)
+            version = cache.get(VERSION_KEY)
+        return version
+
+    @staticmethod
+    def invalidate():
+        cache.set(
+            VERSION_KEY, time.time_ns(), settings.CACHE_VERSION_TIMEOUT)
+
+    def refresh(self):
+        if (version := self.get_version()) == self.version:
+            return self.index
+        with self.lock:
+            if version != self.version:
+                rows = sorted(
+                    (name.casefold(), ingredient_id, name, unit)
+                    for ingredient_id, name, unit in (
+                        Ingredient.objects.values_list(
+                            'id', 'name', 'measurement_unit').iterator()))
+                self.index = (
+                    tuple(key for key, *_ in rows),
+                    tuple(ingredient_id for _, ingredient_id, *_ in rows),
+                    {ingredient_id: {
+                        'id': ingredient_id, 'name': name,
+                        'measurement_unit': unit}
+                     for _, ingredient_id, name, unit in rows})
+                self.version = version
+        return self.index
+
+    def search(self, query, limit=None):
+        return self.find(self.refresh(), query, limit)
+
+    def get_ingredients(self, query, limit=None):
+        index = self.refresh()
+        _, _, rows = index
+        return [
+            rows[ingredient_id]
+            for ids in self.find(index, query, limit)
+            for ingredient_id in ids]
+
+    @staticmethod
+    def find(index, query, limit):
+        keys, ids, _ = index
+        query = query.casefold()
+        prefix, substring = [], []
+        position = bisect_left(keys, query)
+        while (position < len(keys) and keys[position].startswith(query)
+               and (limit is None or len(prefix) < limit)):
+            prefix.append(ids[position])
+            position += 1
+        if limit is not None and len(prefix) >= limit:
+            return prefix, substring
+        for key, ingredient_id in zip(keys, ids):
+            if query in key and not key.startswith(query):
+                substring.append(ingredient_id)
+                if (limit is not None
+                        and len(prefix) + len(substring) >= limit):
+                    break
+        return prefix, substring
+
+
+ingredient_index = IngredientIndex()
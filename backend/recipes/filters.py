@@ -1,37 +1,59 @@
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework as filters
-from recipes.models import Ingredient
 
-from recipes.models import Recipe
+from recipes.autocomplete import ingredient_index
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingList, Tag
+from recipes.search import recipe_search_index
 
 
 class RecipeFilter(filters.FilterSet):
-    tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
-    is_favorited = filters.BooleanFilter(
-        field_name='is_favorited', method='get_favorite')
-    is_in_shopping_cart = filters.BooleanFilter(
-        field_name='is_in_shopping_cart',
-        method='shopping_cart_filter'
-    )
+    tags = filters.MultipleChoiceFilter(
+        choices=Tag.get_slug_choices, method='filter_tags')
+    is_favorited = filters.BooleanFilter(method='get_favorite')
+    is_in_shopping_cart = filters.BooleanFilter(method='shopping_cart_filter')
     author = filters.CharFilter(field_name='author')
+    search = filters.CharFilter(method='filter_search')
 
-    def get_favorite(self, *_):
-        if self.request.user.is_anonymous:
-            return Recipe.objects.all()
-        return Recipe.objects.filter(favorites__user=self.request.user)
+    def filter_tags(self, queryset, _, slugs):
+        return queryset.filter(Exists(Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk'), tag__slug__in=slugs)))
 
-    def shopping_cart_filter(self, *_):
+    def filter_user_recipes(self, queryset, model, value):
         if self.request.user.is_anonymous:
-            return Recipe.objects.all()
-        return Recipe.objects.filter(shopping_list__user=self.request.user)
+            return queryset
+        exists = Exists(model.objects.filter(
+            user=self.request.user, repice=OuterRef('pk')))
+        return queryset.filter(exists if value else ~exists)
+
+    def get_favorite(self, queryset, _, value):
+        return self.filter_user_recipes(queryset, Favorite, value)
+
+    def shopping_cart_filter(self, queryset, _, value):
+        return self.filter_user_recipes(queryset, ShoppingList, value)
+
+    def filter_search(self, queryset, _, value):
+        return recipe_search_index.search(queryset, value)
 
 
 class TagFilter(filters.FilterSet):
-    tags = filters.AllValuesMultipleFilter(field_name='slug')
+    tags = filters.MultipleChoiceFilter(
+        field_name='slug', choices=Tag.get_slug_choices, distinct=False)
 
 
 class IngredientFilter(filters.FilterSet):
-    name = filters.CharFilter(field_name='name', lookup_expr='istartswith', )
+    name = filters.CharFilter()
+    limit = filters.NumberFilter(method='filter_limit', min_value=1)
 
     class Meta:
         model = Ingredient
-        fields = ('name',)
+        fields = ('name', 'limit')
+
+    def filter_queryset(self, queryset):
+        if not (name := self.form.cleaned_data.get('name')):
+            return super().filter_queryset(queryset)
+        if (limit := self.form.cleaned_data.get('limit')) is not None:
+            limit = int(limit)
+        return ingredient_index.get_ingredients(name, limit)
+
+    def filter_limit(self, queryset, _, value):
+        return queryset[:int(value)]
@@ -0,0 +1,124 @@
+import base64
+import binascii
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
+from io import BytesIO
+from pathlib import PurePosixPath
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import UploadedFile
+from django.db import close_old_connections
+from django.dispatch import Signal
+from PIL import Image, ImageOps
+
+from recipes.models import Recipe
+
+CHUNK_SIZE = 64 * 1024
+IMAGE_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+VARIANT_FORMATS = {
+    'jpeg': ('JPEG', 'jpg', {
+        'quality': 85, 'optimize': True, 'progressive': True}),
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+}
+INVALID_IMAGE = 'Загрузите корректное изображение.'
+UNSUPPORTED_FORMAT = 'Неподдерживаемый формат изображения: {0}'
+TOO_LARGE_IMAGE = 'Слишком большое изображение: {0}x{1}'
+VARIANTS_FAILED = 'Не удалось подготовить варианты изображения {0}'
+
+logger = logging.getLogger(__name__)
+variants_created = Signal()
+executor = ThreadPoolExecutor(max(settings.RECIPE_IMAGE_WORKERS, 1))
+
+
+def decode_image(data):
+    payload = data.rpartition(';base64,')[2]
+    file = SpooledTemporaryFile(settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    checksum, size = sha256(), 0
+    try:
+        for start in range(0, len(payload), CHUNK_SIZE):
+            chunk = base64.b64decode(
+                payload[start:start + CHUNK_SIZE], validate=True)
+            checksum.update(chunk)
+            size += file.write(chunk)
+        file.seek(0)
+        with Image.open(file) as image:
+            image_format, (width, height) = image.format, image.size
+            image.verify()
+    except (binascii.Error, OSError, SyntaxError, ValueError,
+            Image.DecompressionBombError):
+        raise ValidationError(INVALID_IMAGE)
+    if image_format not in IMAGE_FORMATS:
+        raise ValidationError(UNSUPPORTED_FORMAT.format(image_format))
+    if width * height > settings.RECIPE_IMAGE_MAX_PIXELS:
+        raise ValidationError(TOO_LARGE_IMAGE.format(width, height))
+    file.seek(0)
+    return UploadedFile(
+        file, f'{checksum.hexdigest()}.{IMAGE_FORMATS[image_format]}',
+        f'image/{image_format.lower()}', size)
+
+
+def store_image(data):
+    file = decode_image(data)
+    field = Recipe._meta.get_field('image')
+    if field.storage.exists(name := field.generate_filename(None, file.name)):
+        file.close()
+        return name
+    return file
+
+
+def get_variant_name(name, size, extension):
+    path = PurePosixPath(name)
+    return str(path.parent / size / f'{path.stem}.{extension}')
+
+
+def create_variants(name):
+    storage = Recipe._meta.get_field('image').storage
+    sizes = {}
+    with storage.open(name) as file, Image.open(file) as source:
+        source = ImageOps.exif_transpose(source)
+        source = source.convert(
+            'RGBA' if source.mode in ('RGBA', 'LA', 'P', 'PA') else 'RGB')
+        for size, bounds in settings.RECIPE_IMAGE_SIZES.items():
+            image = source.copy()
+            image.thumbnail(bounds, Image.Resampling.LANCZOS)
+            sizes[size] = {}
+            for key, (image_format, extension, options) in (
+                    VARIANT_FORMATS.items()):
+                variant = get_variant_name(name, size, extension)
+                if not storage.exists(variant):
+                    buffer = BytesIO()
+                    (image.convert('RGB') if image_format == 'JPEG'
+                     else image).save(buffer, image_format, **options)
+                    variant = storage.save(
+                        variant, ContentFile(buffer.getvalue()))
+                sizes[size][key] = variant
+    return {'source': name, 'sizes': sizes}
+
+
+def process_image(name):
+    try:
+        Recipe.objects.filter(image=name).update(
+            image_variants=create_variants(name))
+    except Exception:
+        logger.exception(VARIANTS_FAILED.format(name))
+    else:
+        variants_created.send(sender=Recipe, image=name)
+
+
+def process_image_in_worker(name):
+    close_old_connections()
+    try:
+        process_image(name)
+    finally:
+        close_old_connections()
+
+
+def schedule_variants(name):
+    if settings.RECIPE_IMAGE_WORKERS:
+        executor.submit(process_image_in_worker, name)
+    else:
+        process_image(name)
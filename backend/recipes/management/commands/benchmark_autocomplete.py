@@ -0,0 +1,49 @@
+import random
+from time import perf_counter
+
+from django.core.management import BaseCommand
+
+from recipes.autocomplete import ingredient_index
+from recipes.filters import IngredientFilter
+from recipes.models import Ingredient
+
+RESULT = '{0}: {1:.3f} мс на запрос'
+
+
+class Command(BaseCommand):
+    help = ('Сравнение поиска ингредиентов через ORM, через фильтр '
+            'эндпоинта /api/ingredients/ и по индексу')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--queries', type=int, default=1000,
+            help='Количество поисковых запросов')
+        parser.add_argument(
+            '--length', type=int, default=2, help='Длина префикса')
+
+    @staticmethod
+    def measure(search, queries):
+        start = perf_counter()
+        for query in queries:
+            search(query)
+        return (perf_counter() - start) * 1000 / len(queries)
+
+    def handle(self, *args, **options):
+        names = list(Ingredient.objects.values_list('name', flat=True))
+        if not names:
+            self.stdout.write(self.style.ERROR('Нет ингредиентов'))
+            return
+        queries = [
+            random.choice(names)[:options['length']]
+            for _ in range(options['queries'])]
+        ingredient_index.refresh()
+        self.stdout.write(RESULT.format('ORM istartswith', self.measure(
+            lambda query: list(Ingredient.objects.filter(
+                name__istartswith=query)),
+            queries)))
+        self.stdout.write(RESULT.format('Фильтр эндпоинта', self.measure(
+            lambda query: list(IngredientFilter(
+                {'name': query}, queryset=Ingredient.objects.all()).qs),
+            queries)))
+        self.stdout.write(RESULT.format('Индекс', self.measure(
+            ingredient_index.search, queries)))
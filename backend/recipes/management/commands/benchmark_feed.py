@@ -0,0 +1,56 @@
+from time import perf_counter
+
+from django.core.management import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import FeedEntry, Recipe, User
+
+REPORT = ('{0:<10} {1:>8.2f} мс на запрос, запросов к БД: {2}, '
+          'совпадений с наивной выборкой: {3}/{4}')
+
+
+class Command(BaseCommand):
+    help = ('Сравнение ленты подписок с наивной выборкой '
+            'рецептов через JOIN по подпискам')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    @staticmethod
+    def naive(user, limit):
+        return list(Recipe.objects.filter(
+            author__following__user=user
+        ).order_by('-pub_date', '-id').values_list('id', flat=True)[:limit])
+
+    @staticmethod
+    def timeline(user, limit):
+        return FeedEntry.get_feed(user, None, limit)
+
+    def measure(self, method, users, limit, repeat):
+        start = perf_counter()
+        with CaptureQueriesContext(connection) as context:
+            for _ in range(repeat):
+                results = {user.id: method(user, limit) for user in users}
+        elapsed = (perf_counter() - start) * 1000 / repeat / len(users)
+        return results, elapsed, len(context.captured_queries) // repeat
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.WARNING('Замер ленты...'))
+        users = list(User.objects.order_by(
+            '-subscriptions_count')[:options['users']])
+        if not users:
+            self.stdout.write(self.style.ERROR('Нет пользователей'))
+            return
+        expected, *_ = self.measure(self.naive, users, options['limit'], 1)
+        for name, method in (('naive', self.naive),
+                             ('timeline', self.timeline)):
+            results, elapsed, queries = self.measure(
+                method, users, options['limit'], options['repeat'])
+            self.stdout.write(REPORT.format(
+                name, elapsed, queries // len(users),
+                sum(results[user_id] == ids
+                    for user_id, ids in expected.items()), len(users)))
+        self.stdout.write(self.style.SUCCESS('Замер завершен'))
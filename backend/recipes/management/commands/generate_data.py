@@ -0,0 +1,204 @@
+import random
+import secrets
+from datetime import timedelta
+from io import BytesIO
+from itertools import accumulate, islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import BaseCommand, CommandError, call_command
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+
+from recipes.images import create_variants
+from recipes.models import (COOKING_TIME_BUCKETS_KEY, Composition, Favorite,
+                            Follow, Ingredient, Recipe, ShoppingList, Tag,
+                            User)
+
+WORDS = (
+    'борщ', 'суп', 'салат', 'пирог', 'курица', 'говядина', 'рис', 'гречка',
+    'сыр', 'томаты', 'картофель', 'грибы', 'лук', 'чеснок', 'укроп',
+    'тыква', 'запеченный', 'жареный', 'домашний', 'быстрый', 'острый',
+    'сладкий', 'летний', 'пряный', 'сливочный', 'овощной')
+TEXT_WORDS = 40
+PASSWORD = 'foodgram-benchmark'
+IMAGE_NAME = 'recipe/benchmark.png'
+IMAGE_SIZE = (1200, 800)
+NO_CATALOG = ('Нет тегов или ингредиентов: сначала выполните load_tags '
+              'и import_catalog')
+NO_USERS = 'Нужен хотя бы один пользователь'
+RECIPE_TAGS = 'Теги рецептов'
+CREATED = 'Создано {0}: {1}'
+FINISHED = 'Данные созданы, пароль пользователей: {0}'
+
+
+class Command(BaseCommand):
+    help = ('Генерация синтетических пользователей, подписок, рецептов, '
+            'избранного и списков покупок для нагрузочных тестов')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument(
+            '--recipes', type=int, default=10000,
+            help='Общее число рецептов, авторы выбираются с перекосом '
+                 'в сторону популярных')
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Среднее число подписок на пользователя')
+        parser.add_argument(
+            '--favorites', type=int, default=30,
+            help='Среднее число рецептов в избранном на пользователя')
+        parser.add_argument(
+            '--carts', type=int, default=5,
+            help='Среднее число рецептов в списке покупок на пользователя')
+        parser.add_argument('--ingredients', type=int, default=6,
+                            help='Ингредиентов в рецепте')
+        parser.add_argument('--tags', type=int, default=2,
+                            help='Тегов у рецепта')
+        parser.add_argument('--days', type=int, default=365,
+                            help='За сколько дней распределить публикации')
+        parser.add_argument('--skew', type=float, default=1.0,
+                            help='Показатель закона Ципфа для популярности')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--seed', type=int)
+
+    def bulk_create(self, model, objects, title=None, **kwargs):
+        objects = iter(objects)
+        created = 0
+        while (batch := list(islice(objects, self.batch_size))):
+            model.objects.bulk_create(batch, **kwargs)
+            created += len(batch)
+        self.stdout.write(CREATED.format(
+            title or model._meta.verbose_name_plural, created))
+
+    def get_weights(self, count, skew):
+        return list(accumulate(
+            1 / (rank + 1) ** skew for rank in range(count)))
+
+    def pick(self, population, weights, count, exclude=None):
+        picked = set()
+        if not population:
+            return []
+        for _ in range(3):
+            if len(picked) >= count:
+                break
+            picked.update(
+                item for item in self.random.choices(
+                    population, cum_weights=weights, k=count * 2)
+                if item != exclude)
+        return list(picked)[:count]
+
+    def get_count(self, average):
+        return self.random.randint(0, average * 2) if average else 0
+
+    @staticmethod
+    def create_image():
+        storage = Recipe._meta.get_field('image').storage
+        if not storage.exists(IMAGE_NAME):
+            buffer = BytesIO()
+            Image.linear_gradient('L').resize(IMAGE_SIZE).convert(
+                'RGB').save(buffer, 'PNG')
+            storage.save(IMAGE_NAME, ContentFile(buffer.getvalue()))
+        return IMAGE_NAME, create_variants(IMAGE_NAME)
+
+    def create_users(self, marker, count):
+        password = make_password(PASSWORD)
+        self.bulk_create(User, (
+            User(
+                username=f'{marker}_{number}',
+                email=f'{marker}_{number}@example.com',
+                first_name=self.random.choice(WORDS).capitalize(),
+                last_name=self.random.choice(WORDS).capitalize(),
+                password=password)
+            for number in range(count)))
+        return list(User.objects.filter(
+            username__startswith=f'{marker}_'
+        ).order_by('id').values_list('id', flat=True))
+
+    def create_recipes(self, marker, count, author_ids, options):
+        image, variants = self.create_image()
+        self.bulk_create(Recipe, (
+            Recipe(
+                author_id=author_id,
+                name='{0} {1} #{2}-{3}'.format(
+                    *self.random.sample(WORDS, 2), marker, number
+                ).capitalize(),
+                text=' '.join(self.random.choices(WORDS, k=TEXT_WORDS)),
+                cooking_time=self.random.randint(5, 180),
+                image=image,
+                image_variants=variants)
+            for number, author_id in enumerate(self.random.choices(
+                author_ids, cum_weights=self.get_weights(
+                    len(author_ids), options['skew']), k=count))))
+        recipes = list(Recipe.objects.filter(
+            name__contains=f' #{marker}-').order_by('id').only('id'))
+        now = timezone.now()
+        for recipe in recipes:
+            recipe.pub_date = now - timedelta(
+                seconds=self.random.uniform(0, options['days'] * 86400))
+        Recipe.objects.bulk_update(
+            recipes, ['pub_date'], batch_size=self.batch_size)
+        return [recipe.id for recipe in recipes]
+
+    def create_recipe_relations(self, recipe_ids, options):
+        tag_ids = list(Tag.objects.values_list('id', flat=True))
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        self.bulk_create(Recipe.tags.through, (
+            Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in self.random.sample(
+                tag_ids, min(options['tags'], len(tag_ids)))),
+            title=RECIPE_TAGS)
+        self.bulk_create(Composition, (
+            Composition(
+                recipe_id=recipe_id, ingredients_id=ingredient_id,
+                amount=self.random.randint(1, 500))
+            for recipe_id in recipe_ids
+            for ingredient_id in self.random.sample(
+                ingredient_ids,
+                min(options['ingredients'], len(ingredient_ids)))))
+
+    def create_user_relations(self, user_ids, recipe_ids, options):
+        author_weights = self.get_weights(len(user_ids), options['skew'])
+        popular_recipes = self.random.sample(recipe_ids, len(recipe_ids))
+        recipe_weights = self.get_weights(
+            len(popular_recipes), options['skew'])
+        self.bulk_create(Follow, (
+            Follow(user_id=user_id, following_id=author_id)
+            for user_id in user_ids
+            for author_id in self.pick(
+                user_ids, author_weights,
+                self.get_count(options['follows']), exclude=user_id)),
+            ignore_conflicts=True)
+        for model, average in ((Favorite, options['favorites']),
+                               (ShoppingList, options['carts'])):
+            self.bulk_create(model, (
+                model(user_id=user_id, repice_id=recipe_id)
+                for user_id in user_ids
+                for recipe_id in self.pick(
+                    popular_recipes, recipe_weights,
+                    self.get_count(average))),
+                ignore_conflicts=True)
+
+    def handle(self, *args, **options):
+        if not Tag.objects.exists() or not Ingredient.objects.exists():
+            raise CommandError(NO_CATALOG)
+        if options['users'] < 1:
+            raise CommandError(NO_USERS)
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        marker = f'bench{secrets.token_hex(3)}'
+        self.stdout.write(self.style.WARNING('Генерация данных...'))
+        with transaction.atomic():
+            user_ids = self.create_users(marker, options['users'])
+            recipe_ids = self.create_recipes(
+                marker, options['recipes'], user_ids, options)
+            self.create_recipe_relations(recipe_ids, options)
+            self.create_user_relations(user_ids, recipe_ids, options)
+        cache.delete(COOKING_TIME_BUCKETS_KEY)
+        for command in ('reconcile_counters', 'rebuild_shopping_lists',
+                        'rebuild_recipe_search', 'rebuild_feeds'):
+            call_command(command, stdout=self.stdout, stderr=self.stderr)
+        self.stdout.write(self.style.SUCCESS(FINISHED.format(PASSWORD)))
@@ -0,0 +1,25 @@
+from django.core.management import BaseCommand
+
+from recipes.images import process_image
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Подготовка уменьшенных копий и WebP-вариантов изображений рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Пересоздать варианты, даже если они уже есть')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.WARNING('Подготовка изображений...'))
+        names = set()
+        for name, variants in Recipe.objects.exclude(image='').values_list(
+                'image', 'image_variants').iterator():
+            if options['force'] or variants.get('source') != name:
+                names.add(name)
+        for name in names:
+            process_image(name)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано изображений: {len(names)}'))
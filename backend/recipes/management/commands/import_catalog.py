@@ -0,0 +1,154 @@
+import csv
+import json
+from functools import reduce
+from itertools import islice
+from operator import or_
+from pathlib import Path
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+
+from recipes.models import Ingredient, Tag
+from recipes.signals import catalog_imported
+
+CATALOGS = {
+    'ingredients': (Ingredient, ('name', 'measurement_unit'),
+                    (('name', 'measurement_unit'), )),
+    'tags': (Tag, ('name', 'color', 'slug'),
+             (('slug', ), ('name', ), ('color', ))),
+}
+FORMATS = {'.csv': 'csv', '.json': 'json', '.ndjson': 'ndjson',
+           '.jsonl': 'ndjson'}
+CHUNK_SIZE = 64 * 1024
+FILE_NOT_FOUND = 'Файл не найден: {0}'
+UNKNOWN_FORMAT = 'Не удалось определить формат файла: {0}'
+INVALID_JSON = 'Ожидался JSON-массив объектов: {0}'
+REPORT = ('Добавлено: {inserted}, обновлено: {updated}, '
+          'пропущено: {skipped} за {seconds:.2f} с ({speed:.0f} строк/с)')
+
+
+def read_csv(file, fields):
+    for row in csv.reader(file):
+        yield dict(zip(fields, row)) if len(row) == len(fields) else None
+
+
+def read_ndjson(file, _):
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def read_json(file, _):
+    decoder = json.JSONDecoder()
+    buffer = file.read(CHUNK_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError(INVALID_JSON.format(file.name))
+    buffer = buffer[1:]
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if not (chunk := file.read(CHUNK_SIZE)):
+                raise CommandError(INVALID_JSON.format(file.name))
+            buffer += chunk
+            continue
+        yield item
+        buffer = buffer[end:]
+
+
+READERS = {'csv': read_csv, 'json': read_json, 'ndjson': read_ndjson}
+
+
+class Command(BaseCommand):
+    help = 'Пакетная загрузка справочников из csv, json и ndjson'
+
+    def add_arguments(self, parser):
+        parser.add_argument('catalog', choices=CATALOGS)
+        parser.add_argument('path', help='Путь к файлу (от папки backend)')
+        parser.add_argument('--format', choices=READERS)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    @staticmethod
+    def get_path(path):
+        if not (path := Path(path)).is_absolute():
+            path = settings.BASE_DIR / path
+        if not path.is_file():
+            raise CommandError(FILE_NOT_FOUND.format(path))
+        return path
+
+    @staticmethod
+    def clean(row, fields):
+        if not isinstance(row, dict):
+            return None
+        values = {
+            field: str(row.get(field) or '').strip() for field in fields}
+        return values if all(values.values()) else None
+
+    def import_batch(self, model, fields, uniques, batch):
+        keys = uniques[0]
+        rows = {}
+        for values in batch:
+            rows.setdefault(tuple(values[key] for key in keys), values)
+        owners = {unique: {} for unique in uniques}
+        for instance in model.objects.filter(reduce(or_, (
+                Q(**{f'{unique[0]}__in': {
+                    values[unique[0]] for values in rows.values()}})
+                for unique in uniques))):
+            for unique, taken in owners.items():
+                taken[tuple(
+                    getattr(instance, field) for field in unique)] = instance
+        new, changed = [], []
+        update_fields = [field for field in fields if field not in keys]
+        for key, values in rows.items():
+            instance = owners[keys].get(key) or model(**values)
+            if any(taken.get(tuple(values[field] for field in unique),
+                             instance) is not instance
+                   for unique, taken in owners.items()):
+                continue
+            for unique, taken in owners.items():
+                taken[tuple(values[field] for field in unique)] = instance
+            if instance.pk is None:
+                new.append(instance)
+            elif any(getattr(instance, field) != values[field]
+                     for field in update_fields):
+                for field in update_fields:
+                    setattr(instance, field, values[field])
+                changed.append(instance)
+        model.objects.bulk_create(new)
+        if changed:
+            model.objects.bulk_update(changed, update_fields)
+        self.stats['inserted'] += len(new)
+        self.stats['updated'] += len(changed)
+        self.stats['skipped'] += len(batch) - len(new) - len(changed)
+
+    def handle(self, *args, **options):
+        model, fields, uniques = CATALOGS[options['catalog']]
+        path = self.get_path(options['path'])
+        if not (file_format := options['format'] or FORMATS.get(
+                path.suffix.lower())):
+            raise CommandError(UNKNOWN_FORMAT.format(path))
+        self.stats = {'inserted': 0, 'updated': 0, 'skipped': 0}
+        self.stdout.write(self.style.WARNING('Загрузка данных...'))
+        start = perf_counter()
+        with open(path, encoding='utf-8', newline='') as file:
+            rows = READERS[file_format](file, fields)
+            with transaction.atomic():
+                while (chunk := list(islice(rows, options['batch_size']))):
+                    batch = [
+                        values for row in chunk
+                        if (values := self.clean(row, fields))]
+                    self.stats['skipped'] += len(chunk) - len(batch)
+                    if batch:
+                        self.import_batch(model, fields, uniques, batch)
+        catalog_imported.send(sender=model)
+        seconds = perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(REPORT.format(
+            seconds=seconds,
+            speed=sum(self.stats.values()) / seconds if seconds else 0,
+            **self.stats)))
@@ -1,17 +1,10 @@
-import json
-
-from django.core.management.base import BaseCommand
-
-from recipes.models import Ingredient
+from django.core.management import BaseCommand, call_command
 
 
 class Command(BaseCommand):
     help = 'Загрузка ингредиентов json'
 
     def handle(self, *args, **options):
-        self.stdout.write(self.style.WARNING('Загрузка дынных...'))
-        with open('data/ingredients.json', encoding='utf-8', ) as file:
-            data = json.loads(file.read())
-            Ingredient.objects.bulk_create(
-                Ingredient(**ingredient) for ingredient in data)
-        self.stdout.write(self.style.SUCCESS('Данные загружены.'))
+        call_command(
+            'import_catalog', 'ingredients', 'data/ingredients.json',
+            stdout=self.stdout, stderr=self.stderr)
@@ -1,17 +1,10 @@
-from django.core.management import BaseCommand
-
-from recipes.models import Tag
+from django.core.management import BaseCommand, call_command
 
 
 class Command(BaseCommand):
     help = 'Загрузка тегов'
 
     def handle(self, *args, **kwargs):
-        self.stdout.write(self.style.WARNING('Загрузка дынных...'))
-        data = [
-            {'name': 'Завтрак', 'color': '#FF0000', 'slug': 'breakfast'},
-            {'name': 'Обед', 'color': '#33CCFF', 'slug': 'lunche'},
-            {'name': 'Ужин', 'color': '#FF77FF', 'slug': 'dinner'},
-        ]
-        Tag.objects.bulk_create(Tag(**tag) for tag in data)
-        self.stdout.write(self.style.SUCCESS('Тэги загружены'))
+        call_command(
+            'import_catalog', 'tags', 'data/tags.json',
+            stdout=self.stdout, stderr=self.stderr)
@@ -0,0 +1,15 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from recipes.models import FeedEntry
+
+
+class Command(BaseCommand):
+    help = 'Пересборка лент подписок пользователей'
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.WARNING('Пересборка лент...'))
+        with transaction.atomic():
+            FeedEntry.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей в лентах: {FeedEntry.objects.count()}'))
@@ -0,0 +1,15 @@
+from django.core.management import BaseCommand
+
+from recipes.search import recipe_search_index
+
+
+class Command(BaseCommand):
+    help = 'Пересборка полнотекстового индекса рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.WARNING('Пересборка индекса...'))
+        recipe_search_index.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS('Индекс пересобран'))
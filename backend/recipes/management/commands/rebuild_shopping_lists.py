@@ -0,0 +1,55 @@
+from collections import defaultdict
+
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+
+from recipes.models import Composition, ShoppingListIngredient
+
+
+class Command(BaseCommand):
+    help = 'Проверка и пересборка итогов списков покупок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только проверить расхождения, не исправляя их')
+
+    @staticmethod
+    def get_totals(rows):
+        totals = defaultdict(dict)
+        for user_id, ingredient_id, amount in rows:
+            if amount > 0:
+                totals[user_id][ingredient_id] = amount
+        return totals
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.WARNING('Проверка итогов...'))
+        with transaction.atomic():
+            live = self.get_totals(Composition.objects.filter(
+                recipe__shopping_list__isnull=False
+            ).values_list(
+                'recipe__shopping_list__user', 'ingredients'
+            ).annotate(value=Sum('amount')).order_by())
+            stored = self.get_totals(
+                ShoppingListIngredient.objects.values_list(
+                    'user', 'ingredients', 'amount'))
+            drifted = [
+                user_id for user_id in live.keys() | stored.keys()
+                if live.get(user_id) != stored.get(user_id)]
+            if not drifted:
+                self.stdout.write(self.style.SUCCESS('Расхождений нет'))
+                return
+            self.stdout.write(self.style.ERROR(
+                f'Расхождения у пользователей: {len(drifted)}'))
+            if options['check']:
+                return
+            ShoppingListIngredient.objects.filter(
+                user_id__in=drifted).delete()
+            ShoppingListIngredient.objects.bulk_create(
+                ShoppingListIngredient(
+                    user_id=user_id, ingredients_id=ingredient_id,
+                    amount=amount)
+                for user_id in drifted
+                for ingredient_id, amount in live.get(user_id, {}).items())
+        self.stdout.write(self.style.SUCCESS('Итоги пересобраны'))
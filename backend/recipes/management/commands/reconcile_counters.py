@@ -0,0 +1,54 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Follow, Recipe, User
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'repice'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'subscribers_count', Follow, 'following'),
+    (User, 'subscriptions_count', Follow, 'user'),
+)
+DRIFT = '{0}.{1}: расхождений {2}'
+
+
+def get_actual_count(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{field: OuterRef('pk')}
+        ).order_by().values(field).annotate(
+            count=Count('pk')
+        ).values('count')), 0)
+
+
+class Command(BaseCommand):
+    help = 'Сверка и исправление счетчиков избранного, подписок и рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только проверить расхождения, не исправляя их')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.WARNING('Сверка счетчиков...'))
+        total = 0
+        with transaction.atomic():
+            for model, counter, source, field in COUNTERS:
+                drifted = model.objects.annotate(
+                    actual=get_actual_count(source, field)
+                ).exclude(**{counter: F('actual')}).values_list(
+                    'pk', flat=True)
+                if not (drifted := list(drifted)):
+                    continue
+                total += len(drifted)
+                self.stdout.write(self.style.ERROR(DRIFT.format(
+                    model.__name__, counter, len(drifted))))
+                if not options['check']:
+                    model.objects.filter(pk__in=drifted).update(
+                        **{counter: get_actual_count(source, field)})
+        if not total:
+            self.stdout.write(self.style.SUCCESS('Расхождений нет'))
+        elif not options['check']:
+            self.stdout.write(self.style.SUCCESS('Счетчики исправлены'))
@@ -0,0 +1,52 @@
+# Generated by Django 3.2 on 2026-10-18 19:46
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+import django.db.models.deletion
+
+
+def fill_shopping_list_totals(apps, schema_editor):
+    Composition = apps.get_model('recipes', 'Composition')
+    ShoppingListIngredient = apps.get_model(
+        'recipes', 'ShoppingListIngredient')
+    ShoppingListIngredient.objects.bulk_create(
+        ShoppingListIngredient(
+            user_id=row['recipe__shopping_list__user'],
+            ingredients_id=row['ingredients'], amount=row['value'])
+        for row in Composition.objects.filter(
+            recipe__shopping_list__isnull=False
+        ).values(
+            'recipe__shopping_list__user', 'ingredients'
+        ).annotate(value=Sum('amount')).order_by())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_auto_20230924_1507'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingListIngredient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.IntegerField(default=0, verbose_name='Мера')),
+                ('ingredients', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list_ingredients', to='recipes.ingredient', verbose_name='Продукты')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list_ingredients', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Итог списка покупок',
+                'verbose_name_plural': 'Итоги списков покупок',
+                'ordering': ('user',),
+                'default_related_name': 'shopping_list_ingredients',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppinglistingredient',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredients'), name='unique shopping list ingredient'),
+        ),
+        migrations.RunPython(
+            fill_shopping_list_totals, migrations.RunPython.noop),
+    ]
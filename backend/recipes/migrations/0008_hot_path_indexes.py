@@ -0,0 +1,49 @@
+# Generated by Django 3.2 on 2026-10-18 19:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_cooking_time_index'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='composition',
+            options={'default_related_name': 'compositions', 'verbose_name': 'Мера продуктов', 'verbose_name_plural': 'Меры продуктов'},
+        ),
+        migrations.AlterModelOptions(
+            name='favorite',
+            options={'default_related_name': 'favorites', 'verbose_name': 'Избранное', 'verbose_name_plural': 'Избранное'},
+        ),
+        migrations.AlterModelOptions(
+            name='follow',
+            options={'verbose_name': 'Подписка', 'verbose_name_plural': 'Подписки'},
+        ),
+        migrations.AlterModelOptions(
+            name='shoppinglist',
+            options={'default_related_name': 'shopping_list', 'verbose_name': 'Список покупок', 'verbose_name_plural': 'Список покупок'},
+        ),
+        migrations.AlterModelOptions(
+            name='shoppinglistingredient',
+            options={'default_related_name': 'shopping_list_ingredients', 'verbose_name': 'Итог списка покупок', 'verbose_name_plural': 'Итоги списков покупок'},
+        ),
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(fields=['user', 'repice'], name='favorite_user_recipe_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pub_date'], name='recipe_author_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-pub_date', '-id'], name='recipe_pub_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shoppinglist',
+            index=models.Index(fields=['user', 'repice'], name='shoppinglist_user_recipe_idx'),
+        ),
+    ]
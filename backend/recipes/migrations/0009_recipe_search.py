@@ -0,0 +1,65 @@
+# Generated by Django 3.2 on 2026-10-18 21:10
+
+from django.conf import settings
+from django.db import migrations
+
+CREATE_SQL = {
+    'sqlite': (
+        "CREATE VIRTUAL TABLE recipes_recipe_search USING fts5(name, text, "
+        "ingredients, tokenize='unicode61 remove_diacritics 2')", ),
+    'postgresql': (
+        'CREATE TABLE recipes_recipe_search (recipe_id bigint PRIMARY KEY, '
+        'document tsvector NOT NULL)',
+        'CREATE INDEX recipes_recipe_search_document_idx '
+        'ON recipes_recipe_search USING gin (document)'),
+}
+INGREDIENTS_SQL = {
+    'sqlite': "group_concat(ingredient.name, ' ')",
+    'postgresql': "string_agg(ingredient.name, ' ')",
+}
+BACKFILL_SQL = {
+    'sqlite': (
+        'INSERT INTO recipes_recipe_search (rowid, name, text, ingredients) '
+        "SELECT recipe.id, recipe.name, recipe.text, COALESCE(({0}), '') "
+        'FROM recipes_recipe recipe'),
+    'postgresql': (
+        'INSERT INTO recipes_recipe_search (recipe_id, document) '
+        'SELECT recipe.id, '
+        "setweight(to_tsvector(%s::regconfig, recipe.name), 'A') || "
+        "setweight(to_tsvector(%s::regconfig, recipe.text), 'D') || "
+        "setweight(to_tsvector(%s::regconfig, COALESCE(({0}), '')), 'B') "
+        'FROM recipes_recipe recipe'),
+}
+RECIPE_INGREDIENTS_SQL = (
+    'SELECT {0} FROM recipes_composition composition '
+    'INNER JOIN recipes_ingredient ingredient '
+    'ON ingredient.id = composition.ingredients_id '
+    'WHERE composition.recipe_id = recipe.id')
+
+
+def create_search_index(apps, schema_editor):
+    if (vendor := schema_editor.connection.vendor) not in CREATE_SQL:
+        return
+    for sql in CREATE_SQL[vendor]:
+        schema_editor.execute(sql)
+    schema_editor.execute(
+        BACKFILL_SQL[vendor].format(
+            RECIPE_INGREDIENTS_SQL.format(INGREDIENTS_SQL[vendor])),
+        [settings.RECIPE_SEARCH_CONFIG] * 3 if vendor == 'postgresql'
+        else None)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in CREATE_SQL:
+        schema_editor.execute('DROP TABLE IF EXISTS recipes_recipe_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.2 on 2026-10-18 23:40
+
+from django.db import migrations
+
+ALTER_SQL = (
+    'ALTER TABLE recipes_recipe_search ALTER COLUMN recipe_id TYPE bigint')
+
+
+def alter_recipe_id(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(ALTER_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_feed_entry'),
+    ]
+
+    operations = [
+        migrations.RunPython(alter_recipe_id, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,15 @@
+from collections import defaultdict
+
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
+from django.core.cache import cache
 from django.core.validators import MinValueValidator
 from django.core.exceptions import ValidationError
-from django.db import models
-from django.db.models import Sum
+from django.db import connection, models, transaction
+from django.db.models import (Case, F, Prefetch, Sum, Value, When,
+                              Window)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
 
 from foodgram.settings import MAX_LENGTH_EMAIL
 from recipes.validators import validate_username, validate_color
@@ -13,9 +20,44 @@ MAX_LENGTH_COLOR = 7
 
 FOLLOW_STR = '{0} подписан на {1}'
 SUBSCRIBE_ERROR = 'Нельзя подписаться на себя.'
-
-
-class User(AbstractUser):
+COOKING_TIME_BUCKETS_KEY = 'recipes:cooking_time:buckets'
+TAG_SLUGS_KEY = 'recipes:tags:slugs'
+RANKED_RECIPES_SQL = 'SELECT id FROM ({0}) ranked WHERE recipe_rank <= %s'
+TRIMMED_FEED_SQL = 'SELECT id FROM ({0}) ranked WHERE entry_rank > %s'
+REBUILD_FEED_SQL = (
+    'INSERT INTO {0} (user_id, recipe_id, pub_date) '
+    'SELECT user_id, feed_recipe, feed_pub_date FROM ({1}) ranked '
+    'WHERE entry_rank <= %s')
+FEED_SQL = (
+    'SELECT recipe_id FROM ('
+    'SELECT * FROM (SELECT pub_date, recipe_id FROM {0} '
+    'WHERE user_id = %s{4} ORDER BY pub_date DESC, recipe_id DESC LIMIT %s'
+    ') entries UNION '
+    'SELECT * FROM (SELECT pub_date, id FROM {1} '
+    'WHERE author_id IN (SELECT following_id FROM {2} INNER JOIN {3} '
+    'ON {3}.id = following_id WHERE user_id = %s AND subscribers_count > %s)'
+    '{5} ORDER BY pub_date DESC, id DESC LIMIT %s) recipes'
+    ') feed ORDER BY pub_date DESC, recipe_id DESC LIMIT %s')
+FEED_POSITION_SQL = ' AND (pub_date < %s OR (pub_date = %s AND {0} < %s))'
+
+
+class CountersMixin:
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (not self._state.adding and not args
+                and kwargs.get('update_fields') is None
+                and not kwargs.get('force_insert')):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.attname for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+                and field.attname not in deferred]
+        return super().save(*args, **kwargs)
+
+
+class User(CountersMixin, AbstractUser):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
     email = models.EmailField(
@@ -26,6 +68,15 @@ class User(AbstractUser):
     first_name = models.CharField('Имя', max_length=MAX_LENGTH_NAME)
     last_name = models.CharField('Фамилия', max_length=MAX_LENGTH_NAME)
     password = models.CharField('Пароль', max_length=MAX_LENGTH_NAME)
+    recipes_count = models.PositiveIntegerField(
+        'Число рецептов', default=0, editable=False)
+    subscribers_count = models.PositiveIntegerField(
+        'Подписчики', default=0, editable=False)
+    subscriptions_count = models.PositiveIntegerField(
+        'Подписки', default=0, editable=False)
+
+    counter_fields = (
+        'recipes_count', 'subscribers_count', 'subscriptions_count')
 
     class Meta:
         ordering = ('username', )
@@ -46,7 +97,6 @@ class Follow(models.Model):
         verbose_name='Автор')
 
     class Meta:
-        ordering = ('user', )
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
         constraints = (
@@ -80,6 +130,16 @@ class Tag(models.Model):
     def __str__(self) -> str:
         return self.name
 
+    @staticmethod
+    def get_slug_choices():
+        if (choices := cache.get(TAG_SLUGS_KEY)) is None:
+            choices = tuple(
+                (slug, slug)
+                for slug in Tag.objects.values_list('slug', flat=True))
+            cache.set(
+                TAG_SLUGS_KEY, choices, settings.CACHE_VERSION_TIMEOUT)
+        return choices
+
 
 class Ingredient(models.Model):
     name = models.CharField('Название', max_length=MAX_LENGTH, )
@@ -109,7 +169,6 @@ class Composition(models.Model):
         'Мера', validators=[MinValueValidator(1)])
 
     class Meta:
-        ordering = ('recipe', )
         verbose_name = 'Мера продуктов'
         verbose_name_plural = 'Меры продуктов'
         default_related_name = 'compositions'
@@ -135,7 +194,29 @@ class Composition(models.Model):
         )
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+
+    def latest_by_authors(self, author_ids, limit=None):
+        queryset = self.filter(author__in=author_ids)
+        if limit is None or not author_ids:
+            return queryset
+        sql, params = queryset.annotate(recipe_rank=Window(
+            RowNumber(), partition_by=F('author'),
+            order_by=(F('pub_date').desc(), F('id').desc())
+        )).order_by().values('id', 'recipe_rank').query.sql_with_params()
+        return queryset.filter(id__in=RawSQL(
+            RANKED_RECIPES_SQL.format(sql), (*params, limit)))
+
+    def for_feed(self):
+        return self.select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'compositions',
+                queryset=Composition.objects.select_related(
+                    'ingredients').order_by('id')))
+
+
+class Recipe(CountersMixin, models.Model):
     tags = models.ManyToManyField(Tag, verbose_name='Тег')
     author = models.ForeignKey(
         User, on_delete=models.CASCADE, verbose_name='Автор')
@@ -146,19 +227,53 @@ class Recipe(models.Model):
         'Изображение', upload_to='recipe/', blank=False, null=False)
     text = models.TextField('Описание')
     cooking_time = models.PositiveSmallIntegerField(
-        'Время приготовления', validators=[MinValueValidator(1)])
+        'Время приготовления', validators=[MinValueValidator(1)],
+        db_index=True)
     pub_date = models.DateTimeField(
         auto_now_add=True, db_index=True, verbose_name='Дата публикации')
+    favorites_count = models.PositiveIntegerField(
+        'В избранном', default=0, editable=False)
+    image_variants = models.JSONField(
+        'Варианты изображения', default=dict, editable=False)
+
+    counter_fields = ('favorites_count', )
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         default_related_name = 'recipes'
+        indexes = [
+            models.Index(fields=['author', '-pub_date'],
+                         name='recipe_author_pub_date_idx'),
+            models.Index(fields=['-pub_date', '-id'],
+                         name='recipe_pub_date_id_idx'),
+        ]
 
     def __str__(self) -> str:
         return self.name
 
+    @staticmethod
+    def get_cooking_time_buckets():
+        if (buckets := cache.get(COOKING_TIME_BUCKETS_KEY)) is not None:
+            return buckets
+        min_value, max_value = Recipe.objects.aggregate(
+            models.Min('cooking_time'),
+            models.Max('cooking_time')).values()
+        buckets = ()
+        if min_value is not None and (step := (max_value - min_value) // 3):
+            first_threshold = min_value + step
+            secound_threshold = min_value + step * 2
+            buckets = (
+                (min_value, first_threshold - 1),
+                (first_threshold, secound_threshold - 1),
+                (secound_threshold, max_value),
+            )
+        cache.set(
+            COOKING_TIME_BUCKETS_KEY, buckets, settings.CACHE_VERSION_TIMEOUT)
+        return buckets
+
 
 class UserRecipe(models.Model):
     user = models.ForeignKey(
@@ -168,11 +283,14 @@ class UserRecipe(models.Model):
 
     class Meta:
         abstract = True
-        ordering = ('user', )
         constraints = [
             models.UniqueConstraint(fields=['repice', 'user'],
                                     name='unique %(class)s')
         ]
+        indexes = [
+            models.Index(fields=['user', 'repice'],
+                         name='%(class)s_user_recipe_idx')
+        ]
 
     def __str__(self) -> str:
         return f'{self.user.username} добавил {self.repice.name}'
@@ -191,3 +309,241 @@ class ShoppingList(UserRecipe):
         default_related_name = 'shopping_list'
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Список покупок'
+
+
+class ShoppingListIngredient(models.Model):
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, verbose_name='Пользователь')
+    ingredients = models.ForeignKey(
+        Ingredient, on_delete=models.CASCADE, verbose_name='Продукты')
+    amount = models.IntegerField('Мера', default=0)
+
+    class Meta:
+        verbose_name = 'Итог списка покупок'
+        verbose_name_plural = 'Итоги списков покупок'
+        default_related_name = 'shopping_list_ingredients'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'ingredients'],
+                                    name='unique shopping list ingredient')
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.user} : {self.ingredients} - {self.amount}'
+
+    @staticmethod
+    def get_count_ingredients(user):
+        return ShoppingListIngredient.objects.filter(
+            user=user, amount__gt=0
+        ).values(
+            'ingredients__name',
+            'ingredients__measurement_unit'
+        ).annotate(
+            value=F('amount')
+        ).order_by(
+            'ingredients__name'
+        )
+
+    @staticmethod
+    def get_totals(user):
+        return ShoppingListIngredient.objects.filter(
+            user=user, amount__gt=0
+        ).order_by('ingredients').values_list('ingredients', 'amount')
+
+    @staticmethod
+    def apply(user_ids, deltas):
+        user_ids = list(user_ids)
+        if not (deltas := {
+                ingredient: delta for ingredient, delta in deltas.items()
+                if delta}) or not user_ids:
+            return
+        with transaction.atomic():
+            ShoppingListIngredient.objects.bulk_create(
+                (ShoppingListIngredient(
+                    user_id=user_id, ingredients_id=ingredient, amount=0)
+                 for user_id in user_ids
+                 for ingredient, delta in deltas.items() if delta > 0),
+                ignore_conflicts=True)
+            ShoppingListIngredient.objects.filter(
+                user_id__in=user_ids, ingredients_id__in=deltas
+            ).update(amount=F('amount') + Case(
+                *(When(ingredients_id=ingredient, then=Value(delta))
+                  for ingredient, delta in deltas.items()),
+                output_field=models.IntegerField()))
+            ShoppingListIngredient.objects.filter(
+                user_id__in=user_ids, amount__lte=0).delete()
+
+    @staticmethod
+    def get_recipe_amounts(recipe_id):
+        return dict(Composition.objects.filter(
+            recipe_id=recipe_id).values_list('ingredients_id', 'amount'))
+
+    @staticmethod
+    def get_recipes_amounts(recipe_ids):
+        return dict(Composition.objects.filter(
+            recipe_id__in=recipe_ids
+        ).order_by().values('ingredients_id').annotate(
+            total=Sum('amount')
+        ).values_list('ingredients_id', 'total'))
+
+    @staticmethod
+    def recipe_changed(recipe, old_amounts, new_amounts=None):
+        if new_amounts is None:
+            new_amounts = ShoppingListIngredient.get_recipe_amounts(recipe.id)
+        if new_amounts == old_amounts:
+            return
+        ShoppingListIngredient.apply(
+            ShoppingList.objects.filter(
+                repice=recipe).values_list('user_id', flat=True),
+            {ingredient: (new_amounts.get(ingredient, 0)
+                          - old_amounts.get(ingredient, 0))
+             for ingredient in new_amounts.keys() | old_amounts.keys()})
+
+
+class FeedEntry(models.Model):
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, verbose_name='Пользователь')
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE, verbose_name='Рецепт')
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        default_related_name = 'feed_entries'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'recipe'],
+                                    name='unique feed entry')
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-recipe'],
+                         name='feed_entry_user_pub_date_idx')
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.user} : {self.recipe}'
+
+    @staticmethod
+    def is_popular(author_id):
+        return User.objects.filter(
+            pk=author_id,
+            subscribers_count__gt=settings.FEED_FANOUT_LIMIT).exists()
+
+    @staticmethod
+    def trim(user_ids):
+        if not user_ids:
+            return
+        sql, params = FeedEntry.objects.filter(
+            user_id__in=user_ids
+        ).annotate(entry_rank=Window(
+            RowNumber(), partition_by=F('user'),
+            order_by=(F('pub_date').desc(), F('recipe').desc()))
+        ).order_by().values('id', 'entry_rank').query.sql_with_params()
+        FeedEntry.objects.filter(id__in=RawSQL(
+            TRIMMED_FEED_SQL.format(sql),
+            (*params, settings.FEED_MAX_LENGTH))).delete()
+
+    @staticmethod
+    def fan_out(recipe):
+        if FeedEntry.is_popular(recipe.author_id):
+            return
+        followers = list(Follow.objects.filter(
+            following=recipe.author_id).values_list('user_id', flat=True))
+        FeedEntry.objects.bulk_create(
+            (FeedEntry(user_id=user_id, recipe=recipe,
+                       pub_date=recipe.pub_date) for user_id in followers),
+            ignore_conflicts=True)
+        FeedEntry.trim(followers)
+
+    @staticmethod
+    def follow_added(follow):
+        if FeedEntry.is_popular(follow.following_id):
+            return
+        FeedEntry.follows_added(follow.user_id, [follow.following_id])
+
+    @staticmethod
+    def follows_added(user_id, author_ids):
+        recipes = Recipe.objects.filter(
+            author__in=author_ids,
+            author__subscribers_count__lte=settings.FEED_FANOUT_LIMIT
+        ).order_by('-pub_date', '-id').values_list('id', 'pub_date')
+        FeedEntry.objects.bulk_create(
+            (FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                       pub_date=pub_date)
+             for recipe_id, pub_date in recipes[:settings.FEED_MAX_LENGTH]),
+            ignore_conflicts=True)
+        FeedEntry.trim([user_id])
+
+    @staticmethod
+    def rebuild():
+        FeedEntry.objects.all().delete()
+        sql, params = Follow.objects.filter(
+            following__subscribers_count__lte=settings.FEED_FANOUT_LIMIT,
+            following__recipes__isnull=False
+        ).annotate(
+            feed_recipe=F('following__recipes__id'),
+            feed_pub_date=F('following__recipes__pub_date'),
+            entry_rank=Window(
+                RowNumber(), partition_by=F('user'),
+                order_by=(F('following__recipes__pub_date').desc(),
+                          F('following__recipes__id').desc()))
+        ).order_by().values(
+            'user', 'feed_recipe', 'feed_pub_date', 'entry_rank'
+        ).query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                REBUILD_FEED_SQL.format(
+                    connection.ops.quote_name(FeedEntry._meta.db_table), sql),
+                (*params, settings.FEED_MAX_LENGTH))
+
+    @staticmethod
+    def follow_removed(follow):
+        FeedEntry.follows_removed(follow.user_id, [follow.following_id])
+
+    @staticmethod
+    def follows_removed(user_id, author_ids):
+        FeedEntry.objects.filter(
+            user=user_id, recipe__author__in=author_ids).delete()
+        FeedEntry.fan_out_demoted(author_ids)
+
+    @staticmethod
+    def fan_out_demoted(author_ids):
+        if not (author_ids := list(User.objects.filter(
+                id__in=author_ids,
+                subscribers_count=settings.FEED_FANOUT_LIMIT
+        ).values_list('id', flat=True))):
+            return
+        recipes = defaultdict(list)
+        for recipe_id, author_id, pub_date in Recipe.objects.latest_by_authors(
+                author_ids, settings.FEED_MAX_LENGTH
+        ).order_by().values_list('id', 'author', 'pub_date'):
+            recipes[author_id].append((recipe_id, pub_date))
+        followers = list(Follow.objects.filter(
+            following__in=author_ids).values_list('user_id', 'following_id'))
+        FeedEntry.objects.bulk_create(
+            (FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                       pub_date=pub_date)
+             for user_id, author_id in followers
+             for recipe_id, pub_date in recipes[author_id]),
+            batch_size=settings.FEED_MAX_LENGTH, ignore_conflicts=True)
+        FeedEntry.trim({user_id for user_id, _ in followers})
+
+    @staticmethod
+    def get_feed(user, position, limit):
+        entries_params = (user.id, )
+        recipes_params = (user.id, settings.FEED_FANOUT_LIMIT)
+        entries_position = recipes_position = ''
+        if position is not None:
+            pub_date, recipe_id = position
+            pub_date = connection.ops.adapt_datetimefield_value(pub_date)
+            entries_position = FEED_POSITION_SQL.format('recipe_id')
+            recipes_position = FEED_POSITION_SQL.format('id')
+            entries_params += (pub_date, pub_date, recipe_id)
+            recipes_params += (pub_date, pub_date, recipe_id)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                FEED_SQL.format(
+                    *(connection.ops.quote_name(model._meta.db_table)
+                      for model in (FeedEntry, Recipe, Follow, User)),
+                    entries_position, recipes_position),
+                (*entries_params, limit, *recipes_params, limit, limit))
+            return [recipe_id for recipe_id, in cursor.fetchall()]
@@ -0,0 +1,55 @@
+from django.db import connection, transaction
+
+from recipes.models import Favorite, Follow, ShoppingList, User
+from recipes.signals import relations_changed
+
+RELATION_FIELDS = {
+    Favorite: 'repice',
+    ShoppingList: 'repice',
+    Follow: 'following',
+}
+DELETE_RELATIONS_SQL = 'DELETE FROM {0} WHERE {1} IN ({2})'
+
+
+def get_relations(model, user_id, ids):
+    field = RELATION_FIELDS[model]
+    return model.objects.filter(
+        user=user_id, **{f'{field}__in': ids}), field
+
+
+def lock_user(user_id):
+    list(User.objects.select_for_update().filter(
+        pk=user_id).values_list('pk', flat=True))
+
+
+def add_relations(model, user_id, ids):
+    relations, field = get_relations(model, user_id, ids)
+    with transaction.atomic():
+        lock_user(user_id)
+        existing = set(relations.values_list(field, flat=True))
+        if (created := [pk for pk in ids if pk not in existing]):
+            model.objects.bulk_create(
+                (model(user_id=user_id, **{f'{field}_id': pk})
+                 for pk in created),
+                ignore_conflicts=True)
+            relations_changed.send(
+                sender=model, user_id=user_id, ids=created, delta=1)
+    return created
+
+
+def remove_relations(model, user_id, ids):
+    relations, field = get_relations(model, user_id, ids)
+    with transaction.atomic():
+        lock_user(user_id)
+        if (removed := dict(relations.values_list('pk', field))):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    DELETE_RELATIONS_SQL.format(
+                        connection.ops.quote_name(model._meta.db_table),
+                        connection.ops.quote_name(model._meta.pk.column),
+                        ', '.join(['%s'] * len(removed))),
+                    list(removed))
+            relations_changed.send(
+                sender=model, user_id=user_id, ids=list(removed.values()),
+                delta=-1)
+    return list(removed.values())
@@ -0,0 +1,134 @@
+import re
+from collections import defaultdict
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from recipes.models import Recipe
+
+SEARCH_TABLE = 'recipes_recipe_search'
+WORD_PATTERN = re.compile(r'\w+')
+MAX_WORDS = 8
+INSERT_SQL = {
+    'sqlite': (
+        'INSERT INTO {0} (rowid, name, text, ingredients) '
+        'VALUES (%s, %s, %s, %s)'),
+    'postgresql': (
+        'INSERT INTO {0} (recipe_id, document) VALUES (%s, '
+        "setweight(to_tsvector(%s::regconfig, %s), 'A') || "
+        "setweight(to_tsvector(%s::regconfig, %s), 'D') || "
+        "setweight(to_tsvector(%s::regconfig, %s), 'B'))"),
+}
+DELETE_SQL = {
+    'sqlite': 'DELETE FROM {0} WHERE rowid IN ({1})',
+    'postgresql': 'DELETE FROM {0} WHERE recipe_id IN ({1})',
+}
+MATCH_SQL = {
+    'sqlite': 'SELECT rowid FROM {0} WHERE {0} MATCH %s',
+    'postgresql': (
+        'SELECT recipe_id FROM {0} '
+        'WHERE document @@ to_tsquery(%s::regconfig, %s)'),
+}
+RANK_SQL = {
+    'sqlite': (
+        'SELECT score FROM (SELECT rowid AS recipe_id, '
+        '-bm25({0}, 10.0, 1.0, 5.0) AS score FROM {0} WHERE {0} MATCH %s '
+        'LIMIT -1) ranked WHERE recipe_id = {1}.id'),
+    'postgresql': (
+        'SELECT ts_rank(document, to_tsquery(%s::regconfig, %s)) '
+        'FROM {0} WHERE recipe_id = {1}.id'),
+}
+QUERY_WORD = {'sqlite': '"{0}"*', 'postgresql': '{0}:*'}
+QUERY_SEPARATOR = {'sqlite': ' ', 'postgresql': ' & '}
+
+
+class RecipeSearchIndex:
+
+    @property
+    def vendor(self):
+        return connection.vendor
+
+    @property
+    def supported(self):
+        return self.vendor in INSERT_SQL
+
+    def get_params(self, *values):
+        if self.vendor != 'postgresql':
+            return values
+        return [
+            param for value in values
+            for param in (settings.RECIPE_SEARCH_CONFIG, value)]
+
+    def remove(self, recipe_ids):
+        if not self.supported or not (recipe_ids := list(recipe_ids)):
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(DELETE_SQL[self.vendor].format(
+                SEARCH_TABLE, ', '.join(['%s'] * len(recipe_ids))),
+                recipe_ids)
+
+    def update(self, recipe_ids):
+        if not self.supported or not (recipe_ids := list(recipe_ids)):
+            return
+        documents = {}
+        ingredients = defaultdict(list)
+        for recipe_id, name, text, ingredient in Recipe.objects.filter(
+                id__in=recipe_ids).values_list(
+                    'id', 'name', 'text',
+                    'compositions__ingredients__name').order_by():
+            documents[recipe_id] = (name, text)
+            if ingredient:
+                ingredients[recipe_id].append(ingredient)
+        self.remove(recipe_ids)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                INSERT_SQL[self.vendor].format(SEARCH_TABLE),
+                [(recipe_id, *self.get_params(
+                    name, text, ' '.join(ingredients[recipe_id])))
+                 for recipe_id, (name, text) in documents.items()])
+
+    def rebuild(self, batch_size=500):
+        if not self.supported:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        recipe_ids = iter(Recipe.objects.order_by('id').values_list(
+            'id', flat=True))
+        while (batch := list(islice(recipe_ids, batch_size))):
+            self.update(batch)
+
+    def get_words(self, query):
+        return WORD_PATTERN.findall(query.casefold())[:MAX_WORDS]
+
+    def get_query_params(self, words):
+        return self.get_params(QUERY_SEPARATOR[self.vendor].join(
+            QUERY_WORD[self.vendor].format(word) for word in words))
+
+    def filter(self, queryset, query):
+        if not (words := self.get_words(query)):
+            return queryset
+        if not self.supported:
+            for word in words:
+                queryset = queryset.filter(
+                    Q(name__icontains=word) | Q(text__icontains=word))
+            return queryset
+        return queryset.filter(id__in=RawSQL(
+            MATCH_SQL[self.vendor].format(SEARCH_TABLE),
+            self.get_query_params(words)))
+
+    def search(self, queryset, query):
+        queryset = self.filter(queryset, query)
+        if not self.supported or not (words := self.get_words(query)):
+            return queryset
+        return queryset.annotate(search_rank=RawSQL(
+            RANK_SQL[self.vendor].format(
+                SEARCH_TABLE,
+                connection.ops.quote_name(queryset.model._meta.db_table)),
+            self.get_query_params(words))
+        ).order_by('-search_rank', '-pub_date', '-id')
+
+
+recipe_search_index = RecipeSearchIndex()
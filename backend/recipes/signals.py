@@ -0,0 +1,164 @@
+from functools import partial
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import Signal, receiver
+
+from recipes.autocomplete import ingredient_index
+from recipes.images import schedule_variants
+from recipes.models import (COOKING_TIME_BUCKETS_KEY, TAG_SLUGS_KEY, Favorite,
+                            FeedEntry, Follow, Ingredient, Recipe,
+                            ShoppingList, ShoppingListIngredient, Tag, User)
+from recipes.search import recipe_search_index
+
+catalog_imported = Signal()
+relations_changed = Signal()
+
+
+@receiver(post_save, sender=ShoppingList)
+def add_to_shopping_list_totals(instance, created, **kwargs):
+    if created:
+        ShoppingListIngredient.apply(
+            [instance.user_id],
+            ShoppingListIngredient.get_recipe_amounts(instance.repice_id))
+
+
+@receiver(pre_delete, sender=ShoppingList)
+def remove_from_shopping_list_totals(instance, **kwargs):
+    ShoppingListIngredient.apply(
+        [instance.user_id],
+        {ingredient: -amount for ingredient, amount in
+         ShoppingListIngredient.get_recipe_amounts(
+             instance.repice_id).items()})
+
+
+@receiver((post_save, post_delete, catalog_imported), sender=Ingredient)
+def refresh_ingredient_index(**kwargs):
+    ingredient_index.invalidate()
+
+
+def change_counter(model, pk, field, delta):
+    change_counters(model, [pk], field, delta)
+
+
+def change_counters(model, pks, field, delta):
+    model.objects.filter(pk__in=pks).update(
+        **{field: Greatest(F(field) + delta, Value(0))})
+
+
+@receiver(post_save, sender=Favorite)
+def add_favorite_counter(instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, instance.repice_id, 'favorites_count', 1)
+
+
+@receiver(post_delete, sender=Favorite)
+def remove_favorite_counter(instance, **kwargs):
+    change_counter(Recipe, instance.repice_id, 'favorites_count', -1)
+
+
+@receiver(post_save, sender=Follow)
+def add_follow_counters(instance, created, **kwargs):
+    if created:
+        change_counter(User, instance.following_id, 'subscribers_count', 1)
+        change_counter(User, instance.user_id, 'subscriptions_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def remove_follow_counters(instance, **kwargs):
+    change_counter(User, instance.following_id, 'subscribers_count', -1)
+    change_counter(User, instance.user_id, 'subscriptions_count', -1)
+
+
+@receiver(post_save, sender=Recipe)
+def add_recipe_counter(instance, created, **kwargs):
+    if created:
+        change_counter(User, instance.author_id, 'recipes_count', 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_recipe_counter(instance, **kwargs):
+    change_counter(User, instance.author_id, 'recipes_count', -1)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def reset_cooking_time_buckets(**kwargs):
+    cache.delete(COOKING_TIME_BUCKETS_KEY)
+
+
+@receiver((post_save, post_delete, catalog_imported), sender=Tag)
+def reset_tag_slugs(**kwargs):
+    cache.delete(TAG_SLUGS_KEY)
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_search(instance, **kwargs):
+    transaction.on_commit(
+        partial(recipe_search_index.update, [instance.id]))
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_recipe_search(instance, **kwargs):
+    recipe_search_index.remove([instance.id])
+
+
+@receiver(post_save, sender=Ingredient)
+def update_ingredient_recipes_search(instance, created, **kwargs):
+    if not created:
+        recipe_search_index.update(
+            instance.compositions.values_list('recipe', flat=True))
+
+
+@receiver(post_save, sender=Recipe)
+def create_image_variants(instance, **kwargs):
+    if (instance.image and instance.image_variants.get(
+            'source') != instance.image.name):
+        transaction.on_commit(
+            partial(schedule_variants, instance.image.name))
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(instance, created, **kwargs):
+    if created:
+        transaction.on_commit(partial(FeedEntry.fan_out, instance))
+
+
+@receiver(post_save, sender=Follow)
+def add_follow_feed(instance, created, **kwargs):
+    if created:
+        FeedEntry.follow_added(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def remove_follow_feed(instance, **kwargs):
+    FeedEntry.follow_removed(instance)
+
+
+@receiver(relations_changed, sender=Favorite)
+def change_favorite_counters(ids, delta, **kwargs):
+    change_counters(Recipe, ids, 'favorites_count', delta)
+
+
+@receiver(relations_changed, sender=ShoppingList)
+def change_shopping_list_totals(user_id, ids, delta, **kwargs):
+    ShoppingListIngredient.apply(
+        [user_id],
+        {ingredient: amount * delta for ingredient, amount in
+         ShoppingListIngredient.get_recipes_amounts(ids).items()})
+
+
+@receiver(relations_changed, sender=Follow)
+def change_follow_counters(user_id, ids, delta, **kwargs):
+    change_counters(User, ids, 'subscribers_count', delta)
+    change_counters(User, [user_id], 'subscriptions_count', delta * len(ids))
+
+
+@receiver(relations_changed, sender=Follow)
+def change_follow_feed(user_id, ids, delta, **kwargs):
+    if delta > 0:
+        FeedEntry.follows_added(user_id, ids)
+    else:
+        FeedEntry.follows_removed(user_id, ids)